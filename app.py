@@ -1,25 +1,36 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from cleaner_func import load_cleaned_data
-from sqlalchemy import create_engine
-from urllib.parse import quote_plus
+from cleaner_func import (
+    load_cleaned_data, iter_cleaned_chunks, clean_exports, validation_report, KPI_COLS
+)
+from db_func import (
+    create_kpi_engine, ensure_kpi_schema, ingest_kpis, DEFAULT_CHUNKSIZE
+)
+from timing_func import stage, collect_stages
+from kpi_cube import (
+    MONTHS, MONTH_ORDER, period_key, add_month_year, concat_kpi_frames
+)
+from kpi_store import (
+    get_store, REPORTS, DATA_VERSION_TTL, READ_SQL_OPTIONS, KPI_TABLE, kpi_dimension, build_kpi_query
+)
+from kpi_api import serve
+import functools
+import hashlib
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import select, func
 
 # ==============================================
 # CONSTANTS AND CONFIGURATION
 # ==============================================
 
-# Database configuration
-DB_CONFIG = {
-    "user": "root",
-    "password": "LSrqVWjJJeexcYUtPijebYrdYTKfFtHy", 
-    "host": "hopper.proxy.rlwy.net",
-    "port": "42510",
-    "name": "railway"
-}
+# Database connection settings (KPI_DB_*, KPI_DATABASE_URL, pool size) live in db_func, which also
+# loads the .env file (or the file named by KPI_ENV_FILE) the settings below can come from
 
-# KPI columns
-KPI_COLS = ["Total_Income", "DOE", "IOE", "PBT", "GOP"]
+# KPI colors
 KPI_COLORS = {
     "Total_Income": "#1f77b4",
     "DOE": "#ff7f0e",
@@ -28,20 +39,42 @@ KPI_COLORS = {
     "GOP": "#9467bd"
 }
 
-# Month names and ordering
-MONTHS = [
-    "January", "February", "March", "April", "May", "June",
-    "July", "August", "September", "October", "November", "December"
-]
-MONTH_ORDER = {month: idx for idx, month in enumerate(MONTHS, start=1)}
-
-# Quarter mapping
-QUARTER_MAP = {
-    "January": "Q1", "February": "Q1", "March": "Q1",
-    "April": "Q2", "May": "Q2", "June": "Q2",
-    "July": "Q3", "August": "Q3", "September": "Q3",
-    "October": "Q4", "November": "Q4", "December": "Q4"
-}
+# Loading settings (data version TTL, KPI_FLOAT32, KPI_ARROW, KPI_SNAPSHOT_PATH) live in kpi_store
+
+# Also serve the KPI query API from the dashboard process on this port, sharing its cube (0 disables it)
+API_PORT = int(os.environ.get("KPI_API_PORT", "0"))
+
+# How uploads are written: "append" bulk-inserts a new batch the dashboard loads incrementally;
+# "upsert" merges on (year, month, sector, vessel), but replacing stored keys forces a full reload
+INGEST_MODE = os.environ.get("KPI_INGEST_MODE", "append")
+
+# CSV parser for uploads: "pandas", or "pyarrow" to parse only the kept columns with the multithreaded reader
+CSV_ENGINE = os.environ.get("KPI_CSV_ENGINE", "pandas")
+
+# Worker processes cleaning files of a multi-file upload (default: one per CPU)
+UPLOAD_WORKERS = int(os.environ.get("KPI_UPLOAD_WORKERS", "0")) or None
+
+# Validate a random sample of this many rows of larger uploads (0 checks every row)
+VALIDATION_SAMPLE_ROWS = int(os.environ.get("KPI_VALIDATION_SAMPLE_ROWS", "0")) or None
+
+# Uploads larger than this are cleaned and written chunk by chunk
+STREAMING_UPLOAD_BYTES = 100 * 1024 * 1024
+
+# Push sidebar filters and aggregation down to the database instead of pandas
+SQL_PUSHDOWN = os.environ.get("KPI_SQL_PUSHDOWN", "0") == "1"
+
+# Rows sent to the browser per table page; KPI_STYLED_TABLES=1 restores full pandas Styler tables
+TABLE_PAGE_ROWS = 500
+STYLED_TABLES = os.environ.get("KPI_STYLED_TABLES", "0") == "1"
+
+# Built Plotly figures kept for reuse across reruns and sessions (least recently used evicted first)
+FIGURE_CACHE_SIZE = 128
+
+# Build only the selected KPI's chart or table under Individual KPI Analysis ("0" renders all tabs)
+LAZY_KPI_SECTIONS = os.environ.get("KPI_LAZY_SECTIONS", "1") == "1"
+
+# Open the sidebar stage timing panel by default (it can always be switched on in the sidebar)
+TIMING_PANEL = os.environ.get("KPI_TIMING_PANEL", "0") == "1"
 
 # ==============================================
 # CUSTOM CSS STYLING
@@ -227,35 +260,196 @@ def apply_custom_css():
 # HELPER FUNCTIONS
 # ==============================================
 
+@st.cache_resource(show_spinner=False)
 def create_db_engine():
-    """Create and return a database engine"""
-    escaped_password = quote_plus(DB_CONFIG['password'])
-    return create_engine(
-        f"mysql+pymysql://{DB_CONFIG['user']}:{escaped_password}@"
-        f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['name']}"
-    )
+    """Create the database engine and connection pool shared by every session and rerun"""
+    return create_kpi_engine()
 
-def load_and_clean_data(engine):
-    """Load and clean data from database"""
-    df = pd.read_sql("SELECT * FROM kpi_data", con=engine)
-    
-    # Data cleaning
-    df['year'] = df['year'].astype(int)
-    df['sector'] = df['sector'].astype(str).str.strip()
-    df['vessel'] = df['vessel'].astype(str).str.strip()
-    df = df.dropna(subset=['year', 'sector', 'vessel'])
-    
-    # Add month index and month-year columns
-    df['month_index'] = df['month'].map(MONTH_ORDER)
-    df["month_year"] = (
-        df["year"].astype(str) + "-" + df["month_index"].astype(str).str.zfill(2)
+@st.cache_resource(show_spinner=False)
+def prepare_kpi_table(_engine):
+    """Add the batch_id column and index used for incremental loading to an existing kpi_data table"""
+    ensure_kpi_schema(_engine)
+
+def bulk_upload_with_progress(df, engine):
+    """Write an upload (frame or chunk stream) as a new batch, showing progress and throughput"""
+    progress_bar = st.progress(0.0, text="Inserting rows...")
+    
+    def report_progress(inserted, total, elapsed):
+        rate = inserted / elapsed if elapsed > 0 else 0
+        if total is None:  # streaming: total unknown until the last chunk
+            progress_bar.progress(0.0, text=f"Inserted {inserted:,} rows ({rate:,.0f} rows/s)")
+            return
+        progress_bar.progress(
+            inserted / max(total, 1),
+            text=f"Inserted {inserted:,} / {total:,} rows ({rate:,.0f} rows/s)"
+        )
+    
+    with stage("db.write", mode=INGEST_MODE) as fields:
+        stats = ingest_kpis(
+            df, engine, mode=INGEST_MODE, chunksize=DEFAULT_CHUNKSIZE, progress_callback=report_progress
+        )
+        fields["rows"] = stats["rows"]
+    progress_bar.empty()
+    return stats
+
+def finish_upload(stats, engine):
+    """Refresh the cached data after an upload and report what was written"""
+    get_store().invalidate_version()
+    
+    # Fold the new batch into the shared cube right away
+    # (updated rows fail the loader's row-count check and force a full reload)
+    if get_store().cube is not None:
+        load_kpi_cube(engine)
+    st.success(
+        f"✅ Uploaded and saved {stats['rows']} rows to the database "
+        f"in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/s)."
     )
-    df["month_year"] = pd.to_datetime(
-        df["month_year"], format="%Y-%m"
-    ).dt.strftime('%b %Y')
+    if "skipped" in stats:
+        st.info(
+            f"🔁 {stats['inserted']} new, {stats['updated']} updated and "
+            f"{stats['skipped']} unchanged (year, month, sector, vessel) rows."
+        )
+
+def display_validation_report(report, title="🧪 Validation Report"):
+    """Show a validation report from validation_report(), expanded when validation failed"""
+    with st.expander(title, expanded=not report["passed"]):
+        for issue in report["issues"]:
+            st.error(f"❌ {issue}")
+        for warning in report["warnings"]:
+            st.warning(f"⚠️ {warning}")
+        
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Rows Checked", f"{report['checked_rows']:,}" + (" (sample)" if report["sampled"] else ""))
+        col2.metric("Duplicate Rows", report["duplicate_rows"])
+        col3.metric("Rows Sharing a Key", report["duplicate_keys"])
+        
+        column_df = pd.DataFrame({
+            "Missing Values": pd.Series(report["missing_values"], dtype="int64"),
+            "Negative Values": pd.Series(report["negative_values"], dtype="int64")
+        }).fillna(0).astype("int64")
+        st.dataframe(column_df)
+
+def validate_chunks(chunks):
+    """
+    Validate each chunk of a streamed upload before it is written.
+
+    A failing chunk raises, which rolls back the upload's single transaction.
+    Duplicate rows are only detected within a chunk.
+    """
+    for number, chunk in enumerate(chunks, start=1):
+        if chunk.empty:
+            continue
+        report = validation_report(chunk, VALIDATION_SAMPLE_ROWS)
+        if not report["passed"]:
+            display_validation_report(report, title=f"🧪 Validation Report (chunk {number})")
+            raise ValueError(f"Chunk {number} failed validation; nothing was uploaded.")
+        yield chunk
+
+def upload_batch(uploaded_files, engine):
+    """Clean several exports in parallel, then write all valid ones in one bulk load"""
+    with st.spinner(f"Cleaning {len(uploaded_files)} files..."):
+        results = clean_exports(
+            [(file.name, file.getvalue()) for file in uploaded_files],
+            csv_engine=CSV_ENGINE, max_workers=UPLOAD_WORKERS, sample_rows=VALIDATION_SAMPLE_ROWS
+        )
+    
+    st.markdown("### 🗂️ Per-file Summary")
+    summary = pd.DataFrame([
+        {key: value for key, value in result.items() if key not in ("frame", "report")}
+        for result in results
+    ])
+    st.dataframe(summary, hide_index=True, column_config={
+        "seconds": st.column_config.NumberColumn("seconds", format="%.2f")
+    })
+    for result in results:
+        if result["report"] is not None:
+            display_validation_report(result["report"], title=f"🧪 Validation Report: {result['file']}")
+    
+    frames = [result["frame"] for result in results if result["valid"]]
+    if not frames:
+        st.error("❌ None of the files passed validation; nothing was uploaded.")
+        return
+    if len(frames) < len(results):
+        st.warning(f"⚠️ Skipped {len(results) - len(frames)} file(s) that failed cleaning or validation.")
     
+    stats = bulk_upload_with_progress(concat_kpi_frames(frames), engine)
+    finish_upload(stats, engine)
+
+def get_data_version(engine):
+    """Return the (row count, latest batch id) watermark of kpi_data, re-checked every DATA_VERSION_TTL seconds"""
+    return get_store().data_version(engine)
+
+def load_kpi_cube(engine):
+    """Load and clean data from database into the KPI cube shared by all sessions (and the KPI API)"""
+    return get_store().load(engine, loading=st.spinner)
+
+@st.cache_resource(show_spinner=False)
+def start_api_server(_engine):
+    """Serve the KPI query API from a background thread of the dashboard process"""
+    return serve(port=API_PORT, engine=_engine, background=True)
+
+def load_and_clean_data(engine):
+    """Return the cleaned kpi_data frame for the current version of the table"""
+    return load_kpi_cube(engine).frame
+
+# ==============================================
+# QUERY FUNCTIONS
+# ==============================================
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def fetch_kpis(_engine, data_version, group_by, **filters):
+    """Run the push-down query; only the aggregated rows cross the wire"""
+    df = pd.read_sql(build_kpi_query(group_by, **filters), con=_engine, **READ_SQL_OPTIONS)
+    df["year"] = df["year"].astype(int)
+    if "month" in group_by:
+        df = add_month_year(df)
+    return df
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def fetch_distinct(_engine, data_version, name):
+    """Sorted distinct values of a kpi_data dimension"""
+    dimension = kpi_dimension(name)
+    values = pd.read_sql(select(dimension.label(name)).distinct().order_by(dimension), con=_engine)[name]
+    return sorted((values.astype(int) if name == "year" else values).tolist())
+
+@st.cache_data(ttl=DATA_VERSION_TTL, show_spinner=False)
+def fetch_overview(_engine, data_version):
+    """Record count, vessel count and year coverage of kpi_data"""
+    overview_df = pd.read_sql(select(
+        func.count().label("records"),
+        func.count(KPI_TABLE.c.vessel.distinct()).label("vessels"),
+        func.min(KPI_TABLE.c.year).label("min_year"),
+        func.max(KPI_TABLE.c.year).label("max_year")
+    ), con=_engine)
+    return overview_df.iloc[0].tolist()
+
+def query_kpis(cube, engine, grain, group_by, **filters):
+    """Aggregate KPIs by group_by under the sidebar filters, from the cube or in SQL"""
+    with stage("aggregate", grain=grain, source="sql" if SQL_PUSHDOWN else "cube") as fields:
+        if SQL_PUSHDOWN:
+            df = fetch_kpis(engine, get_data_version(engine), tuple(group_by), **filters)
+        else:
+            df = cube.slice(grain, group_by, **filters)
+        fields["rows"] = len(df)
     return df
 
+def kpi_options(cube, engine, name):
+    """Sorted distinct values of a dimension for the sidebar filters"""
+    if SQL_PUSHDOWN:
+        return fetch_distinct(engine, get_data_version(engine), name)
+    return cube.options(name)
+
+@functools.lru_cache(maxsize=65536)
+def debit_credit_label(value):
+    """Bar label for one amount, e.g. ₹1,250.00 (Debit)"""
+    return f"₹{abs(value):,.2f} ({'Debit' if value >= 0 else 'Credit'})"
+
+def debit_credit_labels(values):
+    """Bar labels for a Series of amounts, formatting each distinct value once"""
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    labels = pd.Index([debit_credit_label(value) for value in uniques.tolist()], dtype=object)
+    return pd.Series(labels.take(codes), index=values.index)
+
 def display_kpi_summary(df, kpi_cols):
     """Create and display KPI summary"""
     totals = {col: df[col].sum() for col in kpi_cols}
@@ -274,13 +468,19 @@ def display_kpi_summary(df, kpi_cols):
             </div>
             """, unsafe_allow_html=True)
 
+def display_memory_report(df):
+    """Show per-column memory of the shared KPI frame"""
+    with st.expander("🧠 Memory Usage", expanded=False):
+        usage = df.memory_usage(deep=True, index=False)
+        report = pd.DataFrame({"dtype": df.dtypes.astype(str), "MB": (usage / 1024 ** 2).round(3)})
+        st.caption(f"{usage.sum() / 1024 ** 2:,.2f} MB for {len(df):,} rows")
+        st.dataframe(report)
+
 def create_bar_chart(df, x, y, color=None, facet_col=None, 
                      barmode="group", text_auto=True, width=1000, facet_col_wrap=None):
     # Format bar text: show Paid or Credit, only add if not present
     if "formatted_text" not in df.columns:
-        df["formatted_text"] = df[y].apply(
-            lambda val: f"₹{abs(val):,.2f} ({'Debit' if val >= 0 else 'Credit'})"
-        )
+        df = df.assign(formatted_text=debit_credit_labels(df[y]))
     """Standardized bar chart"""
     fig = px.bar(
         df,
@@ -343,10 +543,9 @@ def create_line_chart(df, x, y, color=None, title=None):
     fig.update_yaxes(showgrid=True, gridcolor='#2a3a6c')
     return fig
 
-def create_month_year_filter(df):
+def create_month_year_filter(years):
     """Create month-year filters"""
     with st.sidebar.expander("📆 Date Range", expanded=True):
-        years = sorted(df['year'].unique().tolist())
         from_year = st.selectbox("From Year", years)
         to_year = st.selectbox("To Year", [y for y in years if y >= from_year])
         from_month = st.selectbox("From Month", MONTHS)
@@ -355,21 +554,111 @@ def create_month_year_filter(df):
     
     return from_year, to_year, from_month, to_month
 
+@st.cache_resource
+def get_figure_cache():
+    """Process-wide LRU cache of built Plotly figures"""
+    return {"figures": OrderedDict(), "hits": 0, "misses": 0, "lock": threading.Lock()}
+
+def show_figure(engine, view, build_figure):
+    """Render a chart, reusing the figure built for the same view (page, chart, filters) and data version"""
+    cache = get_figure_cache()
+    key = hashlib.sha1(repr((view, get_data_version(engine))).encode()).hexdigest()
+    
+    with cache["lock"]:
+        fig = cache["figures"].get(key)
+        if fig is not None:
+            cache["figures"].move_to_end(key)
+            cache["hits"] += 1
+        else:
+            cache["misses"] += 1
+    
+    if fig is None:
+        with stage("figure.build", page=view[0], chart=view[1]):
+            fig = build_figure()
+        with cache["lock"]:
+            cache["figures"][key] = fig
+            while len(cache["figures"]) > FIGURE_CACHE_SIZE:
+                cache["figures"].popitem(last=False)
+    with stage("figure.render", page=view[0], chart=view[1]):
+        st.plotly_chart(fig, use_container_width=True)
+
+def display_figure_cache_stats():
+    """Show figure cache hits and misses in the sidebar"""
+    cache = get_figure_cache()
+    st.sidebar.caption(
+        f"🖼️ Figure cache: {cache['hits']} hits, {cache['misses']} misses, "
+        f"{len(cache['figures'])}/{FIGURE_CACHE_SIZE} cached"
+    )
+
+def display_timing_panel(timings):
+    """Optional sidebar table of the stage timings recorded on this rerun"""
+    if not st.sidebar.toggle("⏱️ Stage timings", value=TIMING_PANEL, key="timing_panel"):
+        return
+    if not timings:
+        st.sidebar.caption("No stages ran on this rerun.")
+        return
+    timing_df = pd.DataFrame(timings)
+    st.sidebar.caption(f"{timing_df['seconds'].sum():.3f}s in {len(timing_df)} timed stages")
+    st.sidebar.dataframe(
+        timing_df, hide_index=True,
+        column_config={"seconds": st.column_config.NumberColumn(format="%.4f")}
+    )
+
+def individual_kpis(key):
+    """KPIs whose Individual KPI Analysis sections are built on this rerun"""
+    if not LAZY_KPI_SECTIONS:
+        return KPI_COLS
+    return [st.radio("Select KPI", KPI_COLS, horizontal=True, key=f"{key}_kpi")]
+
+def kpi_section_tabs(key):
+    """Chart and data containers for a KPI section; in lazy mode the unselected one is None"""
+    if not LAZY_KPI_SECTIONS:
+        return st.tabs(["📊 Chart", "📋 Data"])
+    view = st.radio("View", ["📊 Chart", "📋 Data"], horizontal=True, key=f"{key}_view",
+                    label_visibility="collapsed")
+    container = st.container()
+    return (container, None) if view == "📊 Chart" else (None, container)
+
+def show_kpi_table(df, key, kpi_cols=KPI_COLS):
+    """Native dataframe with ₹ amounts grouped to two decimals, sent one page of rows at a time"""
+    kpi_cols = [col for col in kpi_cols if col in df.columns]
+    if STYLED_TABLES:
+        with stage("table.render", table=key, rows=len(df)):
+            st.dataframe(df.style.format({col: "₹{:,.2f}" for col in kpi_cols}))
+        return
+    
+    page_df = df
+    if len(df) > TABLE_PAGE_ROWS:
+        pages = -(-len(df) // TABLE_PAGE_ROWS)
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, 
+                               step=1, key=f"{key}_page")
+        start = (page - 1) * TABLE_PAGE_ROWS
+        page_df = df.iloc[start:start + TABLE_PAGE_ROWS]
+        st.caption(f"Rows {start + 1:,}–{start + len(page_df):,} of {len(df):,}")
+    with stage("table.render", table=key, rows=len(page_df)):
+        st.dataframe(
+            page_df,
+            # printf formats cannot group digits, so the rupee sign goes in the column label
+            column_config={
+                col: st.column_config.NumberColumn(f"{col} (₹)", format="accounting") for col in kpi_cols
+            }
+        )
+
 def create_data_preview(df, title):
-    """Create a styled data preview"""
+    """Create a formatted data preview"""
     with st.expander(f"📋 {title}", expanded=False):
-        st.dataframe(df.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+        show_kpi_table(df, key=title)
 
 # ==============================================
 # ANALYSIS FUNCTIONS
 # ==============================================
 
-def yearly_analysis(df):
+def yearly_analysis(cube, engine):
     """Yearly analysis page"""
     with st.sidebar.expander("🔍 Analysis Filters", expanded=True):
-        years = sorted(df['year'].unique().tolist())
-        sectors = sorted(df['sector'].unique().tolist())
-        vessels = sorted(df['vessel'].unique().tolist())
+        years = kpi_options(cube, engine, "year")
+        sectors = kpi_options(cube, engine, "sector")
+        vessels = kpi_options(cube, engine, "vessel")
         
         # Filters
         from_year = st.selectbox("From Year", years)
@@ -378,15 +667,12 @@ def yearly_analysis(df):
         selected_vessel = st.selectbox("Select Vessel", vessels)
 
     # Data processing
-    grouped_df = df.groupby(['year', 'sector', 'vessel'])[KPI_COLS].sum().reset_index()
-    
-    # Filter data
-    filtered_df = grouped_df[
-        (grouped_df['year'] >= from_year) &
-        (grouped_df['year'] <= to_year) &
-        (grouped_df['sector'] == selected_sector) &
-        (grouped_df['vessel'] == selected_vessel)
-    ]
+    filters = dict(
+        year_range=(from_year, to_year),
+        sectors=[selected_sector],
+        vessels=[selected_vessel]
+    )
+    filtered_df = query_kpis(cube, engine, *REPORTS["yearly"], **filters)
     
     # Display results
     st.markdown("### 📋 Filtered Yearly KPI Data")
@@ -404,89 +690,74 @@ def yearly_analysis(df):
     viz_type = st.radio("Chart Type", ["Multi-KPI Bar Chart", "Table"], horizontal=True, index=0)
     
     if viz_type == "Multi-KPI Bar Chart":
-        long_df = pd.melt(filtered_df, id_vars=["year"], value_vars=KPI_COLS, 
-                          var_name="KPI", value_name="Value")
-        fig = create_bar_chart(long_df, x="year", y="Value", color="KPI")
-        st.plotly_chart(fig, use_container_width=True)
+        def build_trend_chart():
+            long_df = pd.melt(filtered_df, id_vars=["year"], value_vars=KPI_COLS, 
+                              var_name="KPI", value_name="Value")
+            fig = create_bar_chart(long_df, x="year", y="Value", color="KPI")
+            return fig
+        show_figure(engine, ("yearly", "trend", filters), build_trend_chart)
     else:
-        st.dataframe(filtered_df.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+        show_kpi_table(filtered_df, key="yearly_table")
     
     # Individual KPI charts
     st.markdown("### 📊 Individual KPI Analysis")
-    for kpi in KPI_COLS:
+    for kpi in individual_kpis("yearly"):
         st.markdown(f"#### {kpi} over Years")
         
         # Create tabs for each KPI
-        tab1, tab2 = st.tabs(["📊 Chart", "📋 Data"])
+        tab1, tab2 = kpi_section_tabs(f"yearly_{kpi}")
         
         kpi_df = filtered_df[["year", kpi]].groupby("year").sum().reset_index()
         
-        with tab1:
-            if "formatted_text" not in kpi_df.columns:
-                kpi_df["formatted_text"] = kpi_df[kpi].apply(
-                    lambda val: f"₹{abs(val):,.2f} ({'Debit' if val >= 0 else 'Credit'})"
-                )
-            fig = px.bar(
-                kpi_df, 
-                x="year", 
-                y=kpi,
-                text="formatted_text",
-                color_discrete_sequence=[KPI_COLORS[kpi]]
-            )
-            fig.update_layout(
-                title=f"{kpi} Trend",
-                xaxis_title="Year",
-                yaxis_title="₹ (Lacs)",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white')
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        if tab1 is not None:
+            with tab1:
+                def build_kpi_chart():
+                    chart_df = kpi_df.assign(formatted_text=debit_credit_labels(kpi_df[kpi]))
+                    fig = px.bar(
+                        chart_df, 
+                        x="year", 
+                        y=kpi,
+                        text="formatted_text",
+                        color_discrete_sequence=[KPI_COLORS[kpi]]
+                    )
+                    fig.update_layout(
+                        title=f"{kpi} Trend",
+                        xaxis_title="Year",
+                        yaxis_title="₹ (Lacs)",
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white')
+                    )
+                    return fig
+                show_figure(engine, ("yearly", kpi, filters), build_kpi_chart)
             
-        with tab2:
-            st.dataframe(kpi_df.style.format({kpi: "₹{:,.2f}"}))
+        if tab2 is not None:
+            with tab2:
+                show_kpi_table(kpi_df, key=f"yearly_{kpi}_data", kpi_cols=[kpi])
 
-def monthly_analysis(df):
+def monthly_analysis(cube, engine):
     """Monthly analysis page"""
-    from_year, to_year, from_month, to_month = create_month_year_filter(df)
+    years = kpi_options(cube, engine, "year")
+    from_year, to_year, from_month, to_month = create_month_year_filter(years)
     
     with st.sidebar.expander("🔍 Additional Filters", expanded=True):
-        sectors = sorted(df['sector'].unique().tolist())
-        vessels = sorted(df['vessel'].unique().tolist())
+        sectors = kpi_options(cube, engine, "sector")
+        vessels = kpi_options(cube, engine, "vessel")
         selected_sector = st.selectbox("Select Sector", sectors)
         selected_vessel = st.selectbox("Select Vessel", vessels)
 
     # Data processing
-    grouped_df = df.groupby(['year', 'month', 'sector', 'vessel'])[KPI_COLS].sum().reset_index()
-    grouped_df["month_index"] = grouped_df["month"].map(MONTH_ORDER)
-    grouped_df["month_year"] = (
-        grouped_df["year"].astype(str) + "-" +
-        grouped_df["month_index"].astype(str).str.zfill(2)
+    filters = dict(
+        period_range=(
+            period_key(from_year, MONTH_ORDER[from_month]),
+            period_key(to_year, MONTH_ORDER[to_month])
+        ),
+        sectors=[selected_sector],
+        vessels=[selected_vessel]
     )
-    grouped_df["month_year"] = pd.to_datetime(
-        grouped_df["month_year"], format="%Y-%m"
-    ).dt.strftime('%b %Y')
-    
-    # Create calendar month index for proper sorting
-    calendar_month_map = {m: i for i, m in enumerate(MONTHS, 1)}
-    grouped_df["calendar_month_index"] = grouped_df["month"].map(calendar_month_map)
-    grouped_df = grouped_df.sort_values(by=["year", "calendar_month_index"])
-
-    # Filter data
-    start_date = pd.to_datetime(f"{from_year}-{MONTH_ORDER[from_month]:02}")
-    end_date = pd.to_datetime(f"{to_year}-{MONTH_ORDER[to_month]:02}")
-
-    filtered_df = grouped_df[
-        (pd.to_datetime(grouped_df["year"].astype(str) + "-" + 
-         grouped_df["calendar_month_index"].astype(str).str.zfill(2), format="%Y-%m") >= start_date) &
-        (pd.to_datetime(grouped_df["year"].astype(str) + "-" + 
-         grouped_df["calendar_month_index"].astype(str).str.zfill(2), format="%Y-%m") <= end_date) &
-        (grouped_df['sector'] == selected_sector) &
-        (grouped_df['vessel'] == selected_vessel)
-    ]
-
-    filtered_df = filtered_df.sort_values(by=["year", "calendar_month_index"])
-    display_df = filtered_df.drop(columns=["calendar_month_index"])
+    filtered_df = query_kpis(cube, engine, *REPORTS["monthly"], **filters)
+    filtered_df = filtered_df.sort_values(by="period", kind="stable")
+    display_df = filtered_df
 
     # Display results
     st.markdown("### 📋 Filtered Monthly KPI Data")
@@ -504,64 +775,62 @@ def monthly_analysis(df):
     viz_type = st.radio("Chart Type", ["Multi-KPI Bar Chart", "Table"], horizontal=True, index=0)
 
     if viz_type == "Multi-KPI Bar Chart":
-        long_df = pd.melt(
-            filtered_df,
-            id_vars=["year", "month", "month_year"],
-            value_vars=KPI_COLS,
-            var_name="KPI",
-            value_name="Value"
-        )
-        fig = create_bar_chart(long_df, x="month_year", y="Value", color="KPI")
-        st.plotly_chart(fig, use_container_width=True)
+        def build_trend_chart():
+            long_df = pd.melt(
+                filtered_df,
+                id_vars=["year", "month", "month_year"],
+                value_vars=KPI_COLS,
+                var_name="KPI",
+                value_name="Value"
+            )
+            fig = create_bar_chart(long_df, x="month_year", y="Value", color="KPI")
+            return fig
+        show_figure(engine, ("monthly", "trend", filters), build_trend_chart)
     else:
-        st.dataframe(filtered_df.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+        show_kpi_table(filtered_df, key="monthly_table")
 
     # Individual KPI charts
     st.markdown("### 📊 Individual KPI Analysis")
-    for kpi in KPI_COLS:
+    for kpi in individual_kpis("monthly"):
         st.markdown(f"#### {kpi} over Months")
         
         # Create tabs for each KPI
-        tab1, tab2 = st.tabs(["📊 Chart", "📋 Data"])
+        tab1, tab2 = kpi_section_tabs(f"monthly_{kpi}")
         
         kpi_df = filtered_df[["month", "year", "month_year", kpi]].copy()
-        kpi_df["month_index"] = kpi_df["month"].map(MONTH_ORDER)
-        kpi_df = kpi_df.sort_values(by=["year", "month_index"])
-
-        with tab1:
-            if "formatted_text" not in kpi_df.columns:
-                kpi_df["formatted_text"] = kpi_df[kpi].apply(
-                    lambda val: f"₹{abs(val):,.2f} ({'Debit' if val >= 0 else 'Credit'})"
-                )
-            fig = px.bar(
-                kpi_df,
-                x="month_year",
-                y=kpi,
-                text="formatted_text",
-                color_discrete_sequence=[KPI_COLORS[kpi]]
-            )
-            fig.update_layout(
-                title=f"{kpi} Monthly Trend",
-                xaxis_title="Month-Year",
-                yaxis_title="₹ (Lacs)",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white')
-            )
-            st.plotly_chart(fig, use_container_width=True)
+
+        if tab1 is not None:
+            with tab1:
+                def build_kpi_chart():
+                    chart_df = kpi_df.assign(formatted_text=debit_credit_labels(kpi_df[kpi]))
+                    fig = px.bar(
+                        chart_df,
+                        x="month_year",
+                        y=kpi,
+                        text="formatted_text",
+                        color_discrete_sequence=[KPI_COLORS[kpi]]
+                    )
+                    fig.update_layout(
+                        title=f"{kpi} Monthly Trend",
+                        xaxis_title="Month-Year",
+                        yaxis_title="₹ (Lacs)",
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white')
+                    )
+                    return fig
+                show_figure(engine, ("monthly", kpi, filters), build_kpi_chart)
             
-        with tab2:
-            st.dataframe(kpi_df.style.format({kpi: "₹{:,.2f}"}))
+        if tab2 is not None:
+            with tab2:
+                show_kpi_table(kpi_df, key=f"monthly_{kpi}_data", kpi_cols=[kpi])
 
-def quarterly_analysis(df):
+def quarterly_analysis(cube, engine):
     """Quarterly analysis page"""
     with st.sidebar.expander("🔍 Analysis Filters", expanded=True):
-        years = sorted(df['year'].unique().tolist())
-        sectors = sorted(df['sector'].unique().tolist())
-        vessels = sorted(df['vessel'].unique().tolist())
-        
-        # Add quarter column
-        df["quarter"] = df["month"].map(QUARTER_MAP)
+        years = kpi_options(cube, engine, "year")
+        sectors = kpi_options(cube, engine, "sector")
+        vessels = kpi_options(cube, engine, "vessel")
         
         # Filters
         from_year = st.selectbox("From Year", years, key="q_from_year")
@@ -573,17 +842,16 @@ def quarterly_analysis(df):
         selected_vessel = st.selectbox("Select Vessel", vessels, key="q_vessel")
 
     # Data processing
-    grouped_df = df.groupby(["year", "quarter", "sector", "vessel"])[KPI_COLS].sum().reset_index()
-    grouped_df["quarter_year"] = grouped_df["quarter"] + " " + grouped_df["year"].astype(str)
-    
-    # Filter data
-    filtered_df = grouped_df[
-        (grouped_df["year"] >= from_year) &
-        (grouped_df["year"] <= to_year) &
-        (grouped_df["quarter"].isin(selected_quarters)) &
-        (grouped_df["sector"] == selected_sector) &
-        (grouped_df["vessel"] == selected_vessel)
-    ]
+    filters = dict(
+        year_range=(from_year, to_year),
+        quarters=selected_quarters,
+        sectors=[selected_sector],
+        vessels=[selected_vessel]
+    )
+    filtered_df = query_kpis(cube, engine, *REPORTS["quarterly"], **filters)
+    filtered_df = filtered_df.assign(
+        quarter_year=filtered_df["quarter"].astype(str) + " " + filtered_df["year"].astype(str)
+    )
 
     # Display results
     st.markdown("### 📋 Filtered Quarterly KPI Data")
@@ -601,80 +869,79 @@ def quarterly_analysis(df):
     viz_type = st.radio("Chart Type", ["Multi-KPI Bar Chart", "Table"], horizontal=True, index=0)
 
     if viz_type == "Multi-KPI Bar Chart":
-        long_df = pd.melt(
-            filtered_df,
-            id_vars=["quarter_year"],
-            value_vars=KPI_COLS,
-            var_name="KPI",
-            value_name="Value"
-        )
-        fig = create_bar_chart(long_df, x="quarter_year", y="Value", color="KPI")
-        st.plotly_chart(fig, use_container_width=True)
+        def build_trend_chart():
+            long_df = pd.melt(
+                filtered_df,
+                id_vars=["quarter_year"],
+                value_vars=KPI_COLS,
+                var_name="KPI",
+                value_name="Value"
+            )
+            fig = create_bar_chart(long_df, x="quarter_year", y="Value", color="KPI")
+            return fig
+        show_figure(engine, ("quarterly", "trend", filters), build_trend_chart)
     else:
-        st.dataframe(filtered_df.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+        show_kpi_table(filtered_df, key="quarterly_table")
 
     # Individual KPI charts
     st.markdown("### 📊 Individual KPI Analysis")
-    for kpi in KPI_COLS:
+    for kpi in individual_kpis("quarterly"):
         st.markdown(f"#### {kpi} over Quarters")
         
         # Create tabs for each KPI
-        tab1, tab2 = st.tabs(["📊 Chart", "📋 Data"])
+        tab1, tab2 = kpi_section_tabs(f"quarterly_{kpi}")
         
         kpi_df = filtered_df[["year", "quarter", kpi]].copy()
-        kpi_df["quarter_year"] = kpi_df["quarter"] + " " + kpi_df["year"].astype(str)
-
-        with tab1:
-            if "formatted_text" not in kpi_df.columns:
-                kpi_df["formatted_text"] = kpi_df[kpi].apply(
-                    lambda val: f"₹{abs(val):,.2f} ({'Debit' if val >= 0 else 'Credit'})"
-                )
-            fig = px.bar(
-                kpi_df, 
-                x="quarter_year", 
-                y=kpi,
-                text="formatted_text",
-                color_discrete_sequence=[KPI_COLORS[kpi]]
-            )
-            fig.update_layout(
-                title=f"{kpi} Quarterly Trend",
-                xaxis_title="Quarter",
-                yaxis_title="₹ (Lacs)",
-                plot_bgcolor='rgba(0,0,0,0)',
-                paper_bgcolor='rgba(0,0,0,0)',
-                font=dict(color='white')
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        kpi_df["quarter_year"] = kpi_df["quarter"].astype(str) + " " + kpi_df["year"].astype(str)
+
+        if tab1 is not None:
+            with tab1:
+                def build_kpi_chart():
+                    chart_df = kpi_df.assign(formatted_text=debit_credit_labels(kpi_df[kpi]))
+                    fig = px.bar(
+                        chart_df, 
+                        x="quarter_year", 
+                        y=kpi,
+                        text="formatted_text",
+                        color_discrete_sequence=[KPI_COLORS[kpi]]
+                    )
+                    fig.update_layout(
+                        title=f"{kpi} Quarterly Trend",
+                        xaxis_title="Quarter",
+                        yaxis_title="₹ (Lacs)",
+                        plot_bgcolor='rgba(0,0,0,0)',
+                        paper_bgcolor='rgba(0,0,0,0)',
+                        font=dict(color='white')
+                    )
+                    return fig
+                show_figure(engine, ("quarterly", kpi, filters), build_kpi_chart)
             
-        with tab2:
-            st.dataframe(kpi_df.style.format({kpi: "₹{:,.2f}"}))
+        if tab2 is not None:
+            with tab2:
+                show_kpi_table(kpi_df, key=f"quarterly_{kpi}_data", kpi_cols=[kpi])
 
-def sector_wise_analysis(df):
+def sector_wise_analysis(cube, engine):
     """Sector-wise analysis page"""
-    from_year, to_year, from_month, to_month = create_month_year_filter(df)
+    years = kpi_options(cube, engine, "year")
+    from_year, to_year, from_month, to_month = create_month_year_filter(years)
     
     with st.sidebar.expander("🔍 Additional Filters", expanded=True):
-        sectors = sorted(df['sector'].unique().tolist())
+        sectors = kpi_options(cube, engine, "sector")
         selected_sector = st.multiselect("Select Sector(s)", sectors, default=sectors[:3])
 
     # Data processing
-    grouped_df = df.groupby(['year', 'sector', 'month'])[KPI_COLS].sum().reset_index()
-    grouped_df["month_index"] = grouped_df["month"].map(MONTH_ORDER)
-    grouped_df = grouped_df.sort_values(by=["year", "month_index"])
-    
-    # Filter data
     from_index = MONTH_ORDER[from_month]
     to_index = MONTH_ORDER[to_month]
 
-    filtered_df = grouped_df[
-        (grouped_df["year"] >= from_year) &
-        (grouped_df["year"] <= to_year) &
-        (grouped_df["month_index"] >= from_index) &
-        (grouped_df["month_index"] <= to_index) &
-        (grouped_df["sector"].isin(selected_sector))
-    ]
+    filters = dict(
+        year_range=(from_year, to_year),
+        months=[m for m in MONTHS if from_index <= MONTH_ORDER[m] <= to_index],
+        sectors=selected_sector
+    )
+    filtered_df = query_kpis(cube, engine, *REPORTS["sector_wise"], **filters)
+    filtered_df = add_month_year(filtered_df).sort_values(by="period", kind="stable")
 
-    display_df = filtered_df.drop(columns="month_index")
+    display_df = filtered_df.drop(columns=["month_index", "period", "month_year"])
 
     # Display results
     st.markdown("### 📋 Filtered Sector-wise KPI Data")
@@ -692,93 +959,79 @@ def sector_wise_analysis(df):
     viz_type = st.radio("Chart Type", ["Multi-KPI Bar Chart", "Table"], horizontal=True, index=0)
 
     if viz_type == "Multi-KPI Bar Chart":
-        display_df["month_index"] = display_df["month"].map(MONTH_ORDER)
-        display_df["month_year"] = (
-            display_df["year"].astype(str) + "-" + 
-            display_df["month_index"].astype(str).str.zfill(2)
-        )
-        display_df["month_year"] = pd.to_datetime(
-            display_df["month_year"], format="%Y-%m"
-        ).dt.strftime('%b %Y')
-
-        long_df = pd.melt(
-            display_df, 
-            id_vars=["month_year", "sector"], 
-            value_vars=KPI_COLS, 
-            var_name="KPI", 
-            value_name="Value"
-        )
+        def build_trend_chart():
+            long_df = pd.melt(
+                filtered_df, 
+                id_vars=["month_year", "sector"], 
+                value_vars=KPI_COLS, 
+                var_name="KPI", 
+                value_name="Value"
+            )
 
-        fig = create_bar_chart(
-            long_df,
-            x="month_year",
-            y="Value",
-            color="KPI",
-            facet_col="sector",
-            barmode="stack"
-        )
-        fig.update_traces(textposition="inside")
-        st.plotly_chart(fig, use_container_width=True)
+            fig = create_bar_chart(
+                long_df,
+                x="month_year",
+                y="Value",
+                color="KPI",
+                facet_col="sector",
+                barmode="stack"
+            )
+            fig.update_traces(textposition="inside")
+            return fig
+        show_figure(engine, ("sector_wise", "trend", filters), build_trend_chart)
     else:
-        st.dataframe(display_df.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+        show_kpi_table(display_df, key="sector_wise_table")
 
     # Individual KPI charts
     st.markdown("### 📊 Individual KPI Analysis")
-    for kpi in KPI_COLS:
+    for kpi in individual_kpis("sector_wise"):
         st.markdown(f"#### {kpi} by Sector")
         
         # Create tabs for each KPI
-        tab1, tab2 = st.tabs(["📊 Chart", "📋 Data"])
-        
-        kpi_df = display_df[["month", "year", "sector", kpi]].copy()
-        kpi_df["month_index"] = kpi_df["month"].map(MONTH_ORDER)
-        kpi_df = kpi_df.sort_values(by=["year", "month_index", "sector"])
-        kpi_df["month_year"] = (
-            kpi_df["year"].astype(str) + "-" + 
-            kpi_df["month_index"].astype(str).str.zfill(2)
-        )
-        kpi_df["month_year"] = pd.to_datetime(
-            kpi_df["month_year"], format="%Y-%m"
-        ).dt.strftime('%b %Y')
+        tab1, tab2 = kpi_section_tabs(f"sector_wise_{kpi}")
+        
+        kpi_df = filtered_df.sort_values(by=["period", "sector"])[
+            ["month", "year", "sector", kpi, "month_year"]
+        ]
 
-        with tab1:
-            fig = create_bar_chart(
-                kpi_df, 
-                x="month_year", 
-                y=kpi,
-                color="sector"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        if tab1 is not None:
+            with tab1:
+                def build_kpi_chart():
+                    fig = create_bar_chart(
+                        kpi_df, 
+                        x="month_year", 
+                        y=kpi,
+                        color="sector"
+                    )
+                    return fig
+                show_figure(engine, ("sector_wise", kpi, filters), build_kpi_chart)
             
-        with tab2:
-            st.dataframe(kpi_df.style.format({kpi: "₹{:,.2f}"}))
+        if tab2 is not None:
+            with tab2:
+                show_kpi_table(kpi_df, key=f"sector_wise_{kpi}_data", kpi_cols=[kpi])
 
-def vessel_wise_analysis(df):
+def vessel_wise_analysis(cube, engine):
     """Vessel-wise analysis page"""
-    from_year, to_year, from_month, to_month = create_month_year_filter(df)
+    years = kpi_options(cube, engine, "year")
+    from_year, to_year, from_month, to_month = create_month_year_filter(years)
     
     with st.sidebar.expander("🔍 Additional Filters", expanded=True):
-        vessels = sorted(df['vessel'].unique().tolist())
+        vessels = kpi_options(cube, engine, "vessel")
         selected_vessel = st.multiselect("Select Vessel(s)", vessels, default=vessels[:3])
 
     # Data processing
-    grouped_df = df.groupby(['year', 'vessel', 'month'])[KPI_COLS].sum().reset_index()
-    grouped_df["month_index"] = grouped_df["month"].map(MONTH_ORDER)
-    grouped_df = grouped_df.sort_values(by=["year", "month_index"])
-    
-    # Filter data
     from_index = MONTH_ORDER[from_month]
     to_index = MONTH_ORDER[to_month]
 
-    filtered_df = grouped_df[
-        (grouped_df["year"] >= from_year) &
-        (grouped_df["year"] <= to_year) &
-        (grouped_df["month_index"] >= from_index) &
-        (grouped_df["month_index"] <= to_index) &
-        (grouped_df["vessel"].isin(selected_vessel))
-    ]
+    filters = dict(
+        year_range=(from_year, to_year),
+        months=[m for m in MONTHS if from_index <= MONTH_ORDER[m] <= to_index],
+        vessels=selected_vessel
+    )
+    filtered_df = query_kpis(cube, engine, *REPORTS["vessel_wise"], **filters)
+    filtered_df = add_month_year(filtered_df).sort_values(by="period", kind="stable")
 
-    display_df = filtered_df.drop(columns="month_index")
+    display_df = filtered_df.drop(columns=["month_index", "period", "month_year"])
 
     # Display results
     st.markdown("### 📋 Filtered Vessel-wise KPI Data")
@@ -796,70 +1049,77 @@ def vessel_wise_analysis(df):
     viz_type = st.radio("Chart Type", ["Multi-KPI Bar Chart", "Table"], horizontal=True, index=0)
 
     if viz_type == "Multi-KPI Bar Chart":
-        long_df = pd.melt(
-            display_df, 
-            id_vars=["year", "month", "vessel"], 
-            value_vars=KPI_COLS, 
-            var_name="KPI", 
-            value_name="Value"
-        )
-        long_df["month_year"] = long_df["year"].astype(str) + "-" + long_df["month"]
-        
-        fig = create_bar_chart(
-            long_df,
-            x="month_year",
-            y="Value",
-            color="KPI",
-            facet_col="vessel",
-            facet_col_wrap=4,
-            barmode="stack"
-        )
-        fig.update_layout(margin=dict(t=40), height=600)
-        st.plotly_chart(fig, use_container_width=True)
+        def build_trend_chart():
+            long_df = pd.melt(
+                filtered_df, 
+                id_vars=["year", "month", "month_year", "vessel"], 
+                value_vars=KPI_COLS, 
+                var_name="KPI", 
+                value_name="Value"
+            )
+        
+            fig = create_bar_chart(
+                long_df,
+                x="month_year",
+                y="Value",
+                color="KPI",
+                facet_col="vessel",
+                facet_col_wrap=4,
+                barmode="stack"
+            )
+            fig.update_layout(margin=dict(t=40), height=600)
+            return fig
+        show_figure(engine, ("vessel_wise", "trend", filters), build_trend_chart)
     else:
-        st.dataframe(display_df.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+        show_kpi_table(display_df, key="vessel_wise_table")
 
     # Individual KPI charts
     st.markdown("### 📊 Individual KPI Analysis")
-    for kpi in KPI_COLS:
+    for kpi in individual_kpis("vessel_wise"):
         st.markdown(f"#### {kpi} by Vessel")
         
         # Create tabs for each KPI
-        tab1, tab2 = st.tabs(["📊 Chart", "📋 Data"])
-        
-        kpi_df = display_df[["month", "year", "vessel", kpi]].copy()
-        kpi_df["month_index"] = kpi_df["month"].map(MONTH_ORDER)
-        kpi_df = kpi_df.sort_values(by=["year", "month_index", "vessel"])
-        kpi_df["month_year"] = (
-            kpi_df["year"].astype(str) + "-" + 
-            kpi_df["month_index"].astype(str).str.zfill(2)
-        )
-        kpi_df["month_year"] = pd.to_datetime(
-            kpi_df["month_year"], format="%Y-%m"
-        ).dt.strftime('%b %Y')
+        tab1, tab2 = kpi_section_tabs(f"vessel_wise_{kpi}")
+        
+        kpi_df = filtered_df.sort_values(by=["period", "vessel"])[
+            ["month", "year", "vessel", kpi, "month_year"]
+        ]
 
-        with tab1:
-            fig = create_bar_chart(
-                kpi_df, 
-                x="month_year", 
-                y=kpi,
-                color="vessel"
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        if tab1 is not None:
+            with tab1:
+                def build_kpi_chart():
+                    fig = create_bar_chart(
+                        kpi_df, 
+                        x="month_year", 
+                        y=kpi,
+                        color="vessel"
+                    )
+                    return fig
+                show_figure(engine, ("vessel_wise", kpi, filters), build_kpi_chart)
             
-        with tab2:
-            st.dataframe(kpi_df.style.format({kpi: "₹{:,.2f}"}))
+        if tab2 is not None:
+            with tab2:
+                show_kpi_table(kpi_df, key=f"vessel_wise_{kpi}_data", kpi_cols=[kpi])
 
 # ==============================================
 # MAIN APPLICATION
 # ==============================================
 
 def main():
+    # Time every stage of this rerun for the sidebar panel
+    with collect_stages() as timings:
+        render_page()
+    display_timing_panel(timings)
+
+def render_page():
     # Apply custom CSS
     apply_custom_css()
     
     # Initialize database engine
     engine = create_db_engine()
+    prepare_kpi_table(engine)
+    if API_PORT:
+        start_api_server(engine)
     
     # Page configuration
     st.set_page_config(
@@ -888,24 +1148,51 @@ def main():
     
     if page == "📤 Upload CSV":
         st.markdown("## 📤 Upload Weekly KPI CSV File")
-        uploaded_file = st.file_uploader("Upload your KPI CSV", type=["csv"])
+        uploaded_files = st.file_uploader("Upload your KPI CSV file(s)", type=["csv"], 
+                                          accept_multiple_files=True)
     
-        if uploaded_file is not None:
+        if len(uploaded_files) > 1:
             try:
-                df_uploaded = load_cleaned_data(uploaded_file)
-                df_uploaded.to_sql("kpi_data", con=engine, if_exists='append', index=False)
-                st.success(f"✅ Uploaded and saved {len(df_uploaded)} rows to the database.")
+                upload_batch(uploaded_files, engine)
+            except Exception as e:
+                st.error(f"❌ Failed to process: {e}")
+        elif uploaded_files:
+            uploaded_file = uploaded_files[0]
+            try:
+                if uploaded_file.size > STREAMING_UPLOAD_BYTES:
+                    # Large exports are cleaned, validated and written chunk by chunk; preview the first chunk
+                    chunks = validate_chunks(iter_cleaned_chunks(uploaded_file))
+                    df_uploaded = next(chunks, pd.DataFrame())
+                    stats = bulk_upload_with_progress(itertools.chain([df_uploaded], chunks), engine)
+                else:
+                    df_uploaded = load_cleaned_data(uploaded_file, csv_engine=CSV_ENGINE)
+                    report = validation_report(df_uploaded, VALIDATION_SAMPLE_ROWS)
+                    display_validation_report(report)
+                    if not report["passed"]:
+                        st.error("❌ The file failed validation; nothing was uploaded.")
+                        return
+                    stats = bulk_upload_with_progress(df_uploaded, engine)
+                finish_upload(stats, engine)
                 
                 # Display uploaded data with styling
                 with st.expander("View Uploaded Data", expanded=True):
-                    st.dataframe(df_uploaded.style.format({col: "₹{:,.2f}" for col in KPI_COLS}))
+                    show_kpi_table(df_uploaded, key="upload_preview")
             except Exception as e:
                 st.error(f"❌ Failed to process: {e}")
         return
     
     # Main dashboard
-    # Load data
-    df_cleaned = load_and_clean_data(engine)
+    # Load data (push-down mode leaves kpi_data in the database)
+    if SQL_PUSHDOWN:
+        cube = None
+        total_records, unique_vessels, min_year, max_year = fetch_overview(
+            engine, get_data_version(engine)
+        )
+    else:
+        cube = load_kpi_cube(engine)
+        df_cleaned = cube.frame
+        total_records, unique_vessels = len(df_cleaned), df_cleaned['vessel'].nunique()
+        min_year, max_year = df_cleaned['year'].min(), df_cleaned['year'].max()
     
     # Report type selection
     st.markdown("### 📁 Select Report Type to Continue")
@@ -921,22 +1208,24 @@ def main():
     # Display stats summary
     st.markdown("### 📈 Data Overview")
     col1, col2, col3 = st.columns(3)
-    col1.metric("Total Records", len(df_cleaned))
-    col2.metric("Unique Vessels", df_cleaned['vessel'].nunique())
-    col3.metric("Data Coverage", 
-                f"{df_cleaned['year'].min()} - {df_cleaned['year'].max()}")
+    col1.metric("Total Records", total_records)
+    col2.metric("Unique Vessels", unique_vessels)
+    col3.metric("Data Coverage", f"{min_year} - {max_year}")
+    if not SQL_PUSHDOWN:
+        display_memory_report(df_cleaned)
     
     # Route to analysis
     if report_type == "📅 Yearly Analysis":
-        yearly_analysis(df_cleaned)
+        yearly_analysis(cube, engine)
     elif report_type == "📆 Monthly Analysis":
-        monthly_analysis(df_cleaned)
+        monthly_analysis(cube, engine)
     elif report_type == "🔄 Quarterly Analysis":
-        quarterly_analysis(df_cleaned)
+        quarterly_analysis(cube, engine)
     elif report_type == "🌐 Sector-wise Analysis":
-        sector_wise_analysis(df_cleaned)
+        sector_wise_analysis(cube, engine)
     elif report_type == "🚢 Vessel-wise Analysis":
-        vessel_wise_analysis(df_cleaned)
+        vessel_wise_analysis(cube, engine)
+    display_figure_cache_stats()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
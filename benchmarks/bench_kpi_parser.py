@@ -0,0 +1,67 @@
+"""
+Benchmark the single-pass KPI parser against the previous per-column parsing.
+
+Usage:
+    python benchmarks/bench_kpi_parser.py --rows 3000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from cleaner_func import KPI_COLS, parse_kpi_columns  # noqa: E402
+
+def make_kpi_frame(rows: int, seed: int = 0) -> pd.DataFrame:
+    """KPI columns in the shapes SAP exports produce: comma-formatted, plain text and numeric"""
+    rng = np.random.default_rng(seed)
+    amounts = rng.uniform(-1e6, 1e6, size=(rows, len(KPI_COLS))).round(2)
+    missing = rng.random(rows) < 0.05
+    return pd.DataFrame({
+        "Total_Income": [f"{value:,.2f}" for value in amounts[:, 0]],
+        "DOE": [f"{value:,.2f}" for value in amounts[:, 1]],
+        "IOE": pd.Series([f"{value:.2f}" for value in amounts[:, 2]], dtype=object).mask(missing),
+        "PBT": amounts[:, 3],
+        "GOP": pd.Series(amounts[:, 4]).mask(missing),
+    })
+
+def parse_per_column(df: pd.DataFrame) -> pd.DataFrame:
+    """The step 7 implementation the single-pass parser replaced"""
+    for col in KPI_COLS:
+        df[col] = df[col].astype(str).str.replace(',', '')
+        df[col] = df[col].str.replace(r'[^\d.-]', '', regex=True)
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+        df[col] = df[col].fillna(0).round(2)
+    return df
+
+def time_parser(parser, df: pd.DataFrame, repeat: int):
+    """Best-of-N wall time and the parsed result"""
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        result = parser(frame)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=3_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_kpi_frame(args.rows)
+    legacy_time, legacy = time_parser(parse_per_column, df, args.repeat)
+    single_time, single = time_parser(lambda frame: parse_kpi_columns(frame, KPI_COLS), df, args.repeat)
+    pd.testing.assert_frame_equal(legacy, single)
+
+    print(f"rows:             {args.rows:,}")
+    print(f"per-column parse: {legacy_time:.2f}s")
+    print(f"single-pass:      {single_time:.2f}s")
+    print(f"speedup:          {legacy_time / single_time:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Benchmark the cleaning, loading and aggregation stages on synthetic exports.
+
+Each size gets a synthetic double-header export (and a single-header one for
+the cleaner), which is cleaned, validated, written to a local SQLite stand-in
+for kpi_data, read back and cleaned like the dashboard does, and aggregated
+the way each analysis page does. Stage times are compared against stored
+baselines; stages slower than baseline * threshold fail the run.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 10k,100k,1m --check
+    python benchmarks/bench_pipeline.py --sizes 10k,100k,1m,10m --update-baseline
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from synthetic_export import write_export  # noqa: E402
+from cleaner_func import KPI_COLS, load_cleaned_data, validate_data  # noqa: E402
+from db_func import ingest_kpis  # noqa: E402
+from kpi_cube import KPICube  # noqa: E402
+from kpi_store import REPORTS, build_kpi_query, clean_kpi_frame  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# A stage fails when slower than baseline * threshold ...
+DEFAULT_THRESHOLD = 1.5
+# ... unless it takes less than this many seconds (timer noise)
+MIN_SECONDS = 0.05
+
+# Columns every cleaned export must have
+CLEANED_COLUMNS = ["sector", "vessel", *KPI_COLS, "year", "month"]
+
+# Id columns of each analysis page's long-format (melted) chart data
+MELT_ID_VARS = {
+    "yearly": ["year"],
+    "monthly": ["year", "month"],
+    "quarterly": ["year", "quarter"],
+    "sector_wise": ["year", "sector", "month"],
+    "vessel_wise": ["year", "vessel", "month"],
+}
+
+def parse_size(text: str) -> int:
+    """Row count from "10k", "1m" or "250000" """
+    text = text.strip().lower()
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+def timed(timings: dict, stage: str, func, *args, **kwargs):
+    """Run func, record its wall time under stage and return its result"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+def timed_clean(timings: dict, stage: str, path: str, rows: int, **kwargs) -> pd.DataFrame:
+    """Time load_cleaned_data, recording the time only if it returns every row with the cleaned columns"""
+    start = time.perf_counter()
+    df = load_cleaned_data(path, **kwargs)
+    seconds = time.perf_counter() - start
+    missing = [col for col in CLEANED_COLUMNS if col not in df.columns]
+    if missing or len(df) != rows:
+        raise RuntimeError(f"{stage}: cleaned {len(df):,} of {rows:,} rows, missing columns {missing}")
+    timings[stage] = seconds
+    return df
+
+def page_aggregates(cube: KPICube) -> None:
+    """Every page's slice and long-format reshape"""
+    for report, (grain, group_by) in REPORTS.items():
+        pd.melt(cube.slice(grain, group_by), id_vars=MELT_ID_VARS[report], value_vars=KPI_COLS,
+                var_name="KPI", value_name="Value")
+
+def pushdown_aggregates(engine) -> None:
+    """Every page's aggregation pushed down to SQLite"""
+    for _, group_by in REPORTS.values():
+        pd.read_sql(build_kpi_query(group_by), con=engine)
+
+def run_size(rows: int, workdir: str) -> dict:
+    """Time each stage for one export size"""
+    timings = {}
+    double_path = write_export(os.path.join(workdir, f"export_{rows}.csv"), rows)
+    single_path = write_export(os.path.join(workdir, f"export_{rows}_single.csv"), rows, double_header=False)
+
+    timed_clean(timings, "clean_single_header", single_path, rows)
+    timed_clean(timings, "clean_pyarrow", double_path, rows, csv_engine="pyarrow")
+    df = timed_clean(timings, "clean", double_path, rows)
+    timed(timings, "validate", validate_data, df)
+
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, f'kpi_{rows}.db')}")
+    timed(timings, "db_load", ingest_kpis, df, engine, mode="append")
+    raw_df = timed(timings, "db_read", pd.read_sql, "SELECT * FROM kpi_data", con=engine)
+    frame = timed(timings, "db_clean", clean_kpi_frame, raw_df)
+    cube = timed(timings, "cube_build", KPICube, frame)
+    timed(timings, "page_aggregates", page_aggregates, cube)
+    timed(timings, "pushdown_aggregates", pushdown_aggregates, engine)
+    engine.dispose()
+    return timings
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Stages slower than their baseline by more than the threshold"""
+    regressions = []
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is not None and seconds >= MIN_SECONDS and seconds > base * threshold:
+                regressions.append((size, stage, base, seconds))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="10k,100k,1m", help="comma-separated row counts (k/m suffixes)")
+    parser.add_argument("--check", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--update-baseline", action="store_true", help="store these timings as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes.split(","):
+            rows = parse_size(size)
+            results[str(rows)] = run_size(rows, workdir)
+
+    for size, timings in results.items():
+        print(f"\nrows: {int(size):,}")
+        for stage, seconds in timings.items():
+            base = baseline.get("timings", {}).get(size, {}).get(stage)
+            versus = f"  (baseline {base:.3f}s, {seconds / base:.2f}x)" if base else ""
+            print(f"  {stage:<22}{seconds:8.3f}s{versus}")
+
+    if args.update_baseline:
+        rounded = {size: {stage: round(seconds, 4) for stage, seconds in timings.items()}
+                   for size, timings in results.items()}
+        timings = {**baseline.get("timings", {}), **rounded}
+        with open(args.baseline, "w") as file:
+            json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                       "timings": timings}, file, indent=2)
+            file.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+
+    if args.check:
+        regressions = compare(results, baseline.get("timings", {}), args.threshold)
+        for size, stage, base, seconds in regressions:
+            print(f"REGRESSION {stage} at {int(size):,} rows: {seconds:.3f}s vs baseline {base:.3f}s")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
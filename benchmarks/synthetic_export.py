@@ -0,0 +1,102 @@
+"""
+Generate synthetic SAP-style KPI exports for the benchmarks.
+
+Usage:
+    python benchmarks/synthetic_export.py data/synthetic_1m.csv --rows 1000000
+    python benchmarks/synthetic_export.py data/synthetic_10k.csv --rows 10000 --single-header
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+# Fiscal periods start in April: K4/001.2023 is April 2023, K4/012.2023 is March 2024
+FISCAL_MONTHS = 12
+
+SECTORS = ["CRD", "LPG", "TNK", "OFS", "BLK", "LNR"]
+VESSELS_PER_SECTOR = 10
+VOYAGES_PER_VESSEL = 40
+
+# Export columns: KPI columns as (export name, comma-formatted) pairs
+DIMENSION_COLUMNS = ["Segment", "Sector Code", "Vessel", "Voyage Number", "Fiscal year/period"]
+AMOUNT_COLUMNS = [
+    ("Total Income (In Lacs)", True),
+    ("DOE (In Lacs)", True),
+    ("IOE (In Lacs)", False),
+    ("GOP (In Lacs)", False),
+    ("Profit before Int. & Dep. (In Lacs)", True),
+    ("Depreciation (In Lacs)", False),
+    ("Profit After Depreciation (In Lacs)", False),
+]
+AMOUNT_SUFFIX = "Debit/Credit Amount"
+
+# Rows generated and written per block, bounding memory for 10M-row exports
+BLOCK_ROWS = 500_000
+
+def make_block(rows: int, rng: np.random.Generator, years=(2019, 2025)) -> pd.DataFrame:
+    """One block of export rows with SAP-style formatting"""
+    sector_idx = rng.integers(0, len(SECTORS), rows)
+    vessel_idx = rng.integers(0, VESSELS_PER_SECTOR, rows)
+    sectors = np.array(SECTORS)[sector_idx]
+    vessels = pd.Series(sectors).str.cat(pd.Series(vessel_idx + 1).astype(str).str.zfill(2), sep="-V")
+    periods = rng.integers(1, FISCAL_MONTHS + 1, rows)
+    fiscal_years = rng.integers(years[0], years[1] + 1, rows)
+
+    block = pd.DataFrame({
+        "Segment": "SHIPPING",
+        "Sector Code": sectors,
+        "Vessel": vessels,
+        "Voyage Number": vessels.str.cat(
+            pd.Series(rng.integers(1, VOYAGES_PER_VESSEL + 1, rows)).astype(str), sep="/"
+        ),
+        "Fiscal year/period": [f"K4/{period:03d}.{year}" for period, year in zip(periods, fiscal_years)],
+    })
+    for name, comma_formatted in AMOUNT_COLUMNS:
+        amounts = pd.Series(rng.normal(250, 400, rows).round(2))
+        # Exports leave a few amounts blank
+        amounts = amounts.mask(rng.random(rows) < 0.01)
+        if comma_formatted:
+            amounts = amounts.map("{:,.2f}".format, na_action="ignore")
+        block[f"{name} {AMOUNT_SUFFIX}"] = amounts
+    return block
+
+def write_export(path: str, rows: int, double_header: bool = True, seed: int = 0) -> str:
+    """
+    Write a synthetic export.
+
+    Args:
+        path: Output CSV path
+        rows: Data rows
+        double_header: Split amount headers over two rows like SAP's export
+        seed: Random seed
+
+    Returns:
+        str: The output path
+    """
+    rng = np.random.default_rng(seed)
+    columns = [*DIMENSION_COLUMNS, *(f"{name} {AMOUNT_SUFFIX}" for name, _ in AMOUNT_COLUMNS)]
+    with open(path, "w", encoding="ISO-8859-1", newline="") as file:
+        if double_header:
+            top = [*DIMENSION_COLUMNS, *(name for name, _ in AMOUNT_COLUMNS)]
+            bottom = [""] * len(DIMENSION_COLUMNS) + [AMOUNT_SUFFIX] * len(AMOUNT_COLUMNS)
+            file.write(",".join(f'"{name}"' for name in top) + "\n")
+            file.write(",".join(f'"{name}"' if name else "" for name in bottom) + "\n")
+        else:
+            file.write(",".join(f'"{name}"' for name in columns) + "\n")
+        for offset in range(0, rows, BLOCK_ROWS):
+            block = make_block(min(BLOCK_ROWS, rows - offset), rng)
+            block.to_csv(file, header=False, index=False)
+    return path
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--single-header", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_export(args.path, args.rows, double_header=not args.single_header, seed=args.seed)
+    print(f"wrote {args.rows:,} rows to {args.path}")
+
+if __name__ == "__main__":
+    main()
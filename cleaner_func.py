@@ -1,37 +1,78 @@
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 import re
 import io
 import logging
-from typing import Union, Optional
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Tuple, Union, Optional
+
+from timing_func import StageClock, DIAGNOSTIC_LOGGING
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def load_cleaned_data(file: Union[str, io.BytesIO]) -> pd.DataFrame:
-    """
-    Load and clean financial data from CSV file.
-    
-    Args:
-        file: File path (string) or file-like object
-        
-    Returns:
-        pd.DataFrame: Cleaned dataframe ready for database insertion
+# Default rows per chunk in streaming mode
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Export columns renamed to the database schema
+COLUMN_MAPPING = {
+    "Sector Code": "sector",
+    "Vessel": "vessel",
+    "Total Income (In Lacs) Debit/Credit Amount": "Total_Income",
+    "DOE (In Lacs) Debit/Credit Amount": "DOE",
+    "IOE (In Lacs) Debit/Credit Amount": "IOE",
+    "GOP (In Lacs) Debit/Credit Amount": "GOP",
+    "Profit before Int. & Dep. (In Lacs) Debit/Credit Amount": "PBT",
+    "financial_year": "year",
+    "financial_month": "month"
+}
+
+# KPI columns after renaming
+KPI_COLS = ["Total_Income", "DOE", "IOE", "PBT", "GOP"]
+
+# Natural key of a kpi_data row; several voyages of one vessel and month share it
+NATURAL_KEY = ["year", "month", "sector", "vessel"]
+
+# Export columns the cleaning steps read; the pyarrow reader parses only these
+SOURCE_COLUMNS = [*COLUMN_MAPPING, "Fiscal year/period"]
+
+# Bytes scanned for the header rows in pyarrow mode
+HEADER_SCAN_BYTES = 64 * 1024
+
+def _open_source(file: Union[str, io.BytesIO]) -> Union[str, io.IOBase]:
     """
-    encoding = 'ISO-8859-1'
+    Return something pandas can read (and re-read) for a path or file-like object.
 
-    # Handle different file input types
-    file_obj = None
+    Seekable uploads are used in place instead of being copied into a new buffer.
+    """
     if isinstance(file, str):  # file path
-        file_obj = file
-    else:  # uploaded file-like object
-        try:
-            file_content = file.read()
-            file_obj = io.BytesIO(file_content)
-        except Exception as e:
-            logger.error(f"Error reading file: {e}")
-            raise
+        return file
+    try:
+        if hasattr(file, 'seek') and (not hasattr(file, 'seekable') or file.seekable()):
+            file.seek(0)
+            return file
+        return io.BytesIO(file.read())
+    except Exception as e:
+        logger.error(f"Error reading file: {e}")
+        raise
 
+def detect_header(file_obj: Union[str, io.IOBase], encoding: str = 'ISO-8859-1') -> Optional[list]:
+    """
+    Detect whether the export uses a two-row header.
+
+    Args:
+        file_obj: File path or seekable file-like object
+        encoding: File encoding
+
+    Returns:
+        Optional[list]: Combined column names for a double header, or None for a single header
+    """
     # Step 1: Detect Header Structure
     try:
         header_preview = pd.read_csv(file_obj, encoding=encoding, nrows=3, header=None)
@@ -48,48 +89,110 @@ def load_cleaned_data(file: Union[str, io.BytesIO]) -> pd.DataFrame:
     # Count non-empty, non-unnamed columns in each row
     row0_named = sum(~row0.isna() & ~row0.astype(str).str.lower().str.startswith('unnamed'))
     row1_named = sum(~row1.isna() & ~row1.astype(str).str.lower().str.startswith('unnamed'))
+    # A second header row holds labels only; a first data row has amounts
+    row1_numeric = pd.to_numeric(row1.astype(str).str.replace(',', ''), errors='coerce').notna().sum()
 
-    use_double_header = (row0_named > 2) and (row1_named > 2)
+    use_double_header = (row0_named > 2) and (row1_named > 2) and row1_numeric == 0
     logger.info(f"Using double header: {use_double_header}")
+    if not use_double_header:
+        return None
 
-    # Step 2: Load data based on header structure
-    if use_double_header:
-        combined_headers = []
-        for a, b in zip(row0, row1):
-            if pd.notna(a) and not str(a).startswith("Unnamed"):
-                if pd.notna(b) and not str(b).startswith("Unnamed"):
-                    combined = f"{str(a).strip()} {str(b).strip()}"
-                else:
-                    combined = str(a).strip()
+    combined_headers = []
+    for a, b in zip(row0, row1):
+        if pd.notna(a) and not str(a).startswith("Unnamed"):
+            if pd.notna(b) and not str(b).startswith("Unnamed"):
+                combined = f"{str(a).strip()} {str(b).strip()}"
             else:
-                combined = str(b).strip() if pd.notna(b) else ""
-            combined_headers.append(combined)
+                combined = str(a).strip()
+        else:
+            combined = str(b).strip() if pd.notna(b) else ""
+        combined_headers.append(combined)
+    return combined_headers
 
-        df = pd.read_csv(file_obj, encoding=encoding, skiprows=2, header=None)
-        df.columns = combined_headers
-    else:
-        df = pd.read_csv(file_obj, encoding=encoding)
+def _parse_numbers(values: pd.Series) -> pd.Series:
+    """
+    Parse amount strings to floats, running the regex clean-up only where needed.
 
-    logger.info(f"Initial dataset shape: {df.shape}")
-    logger.info(f"Initial columns: {df.columns.tolist()}")
+    Thousands separators are removed with a literal replace (parsing failures
+    are slow, so they are avoided up front); values that still do not parse
+    have everything except digits, dots and minus stripped.
+    """
+    text = values.astype(str).str.replace(',', '', regex=False)  # Remove commas
+    numbers = pd.to_numeric(text, errors='coerce')
+    needs_cleaning = ~np.isfinite(numbers.to_numpy(dtype=float)) & values.notna().to_numpy()
+    if needs_cleaning.any():
+        numbers[needs_cleaning] = pd.to_numeric(
+            text[needs_cleaning].str.replace(r'[^\d.-]', '', regex=True),  # Keep only digits, dots, and minus
+            errors='coerce'
+        )
+    return numbers
+
+def parse_kpi_columns(df: pd.DataFrame, kpi_cols: list) -> pd.DataFrame:
+    """
+    Convert KPI amount columns to rounded floats in a single pass.
+
+    Columns that are already numeric skip string handling entirely; all text
+    columns are flattened into one series and parsed together.
+
+    Args:
+        df: Dataframe holding the KPI columns
+        kpi_cols: KPI columns present in the dataframe
+
+    Returns:
+        pd.DataFrame: Dataframe with numeric KPI columns (missing values filled with 0)
+    """
+    if not kpi_cols:
+        return df
+
+    text_cols = [col for col in kpi_cols if not pd.api.types.is_numeric_dtype(df[col])]
+    if text_cols:
+        flat = pd.Series(df[text_cols].to_numpy(dtype=object).ravel(order='F'))
+        parsed = _parse_numbers(flat).to_numpy(dtype=float)
+        df[text_cols] = parsed.reshape(len(df), len(text_cols), order='F')
+
+    df[kpi_cols] = df[kpi_cols].astype(float).fillna(0).round(2)  # Fill NaN with 0
+    return df
+
+def compact_dtypes(df: pd.DataFrame, float32_kpis: bool = False) -> pd.DataFrame:
+    """
+    Shrink a cleaned KPI frame: categoricals for dimensions and small integers for year.
+
+    Args:
+        df: Cleaned dataframe
+        float32_kpis: Also store KPI columns as float32 (halves their size, ~7 significant digits)
+
+    Returns:
+        pd.DataFrame: Dataframe with compact dtypes
+    """
+    dtypes = {col: "category" for col in ['sector', 'vessel', 'month'] if col in df.columns}
+    if 'year' in df.columns:
+        dtypes['year'] = "int16"
+    if float32_kpis:
+        dtypes.update({
+            # Arrow-backed columns stay Arrow-backed
+            col: "float[pyarrow]" if isinstance(df[col].dtype, pd.ArrowDtype) else "float32"
+            for col in KPI_COLS if col in df.columns
+        })
+    return df.astype(dtypes)
+
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the cleaning steps to a raw export frame (or one chunk of it).
+
+    Args:
+        df: Raw dataframe with the export's column names
+
+    Returns:
+        pd.DataFrame: Cleaned dataframe ready for database insertion
+    """
+    clock = StageClock("clean")
 
     # Step 3: Rename columns to match database schema
-    column_mapping = {
-        "Sector Code": "sector",
-        "Vessel": "vessel",
-        "Total Income (In Lacs) Debit/Credit Amount": "Total_Income",
-        "DOE (In Lacs) Debit/Credit Amount": "DOE",
-        "IOE (In Lacs) Debit/Credit Amount": "IOE",
-        "GOP (In Lacs) Debit/Credit Amount": "GOP",
-        "Profit before Int. & Dep. (In Lacs) Debit/Credit Amount": "PBT",
-        "financial_year": "year",
-        "financial_month": "month"
-    }
-    
-    df.rename(columns=column_mapping, inplace=True)
+    df.rename(columns=COLUMN_MAPPING, inplace=True)
 
     # Step 4: Remove blank columns
     df = df.loc[:, df.columns.str.strip() != '']
+    clock.lap("rename_columns")
 
     # Step 5: Process fiscal year/period data
     fin_month_map = {
@@ -100,9 +203,15 @@ def load_cleaned_data(file: Union[str, io.BytesIO]) -> pd.DataFrame:
     }
 
     if 'Fiscal year/period' in df.columns:
-        # Extract fiscal month code and year
-        df['fiscal_month_code'] = df['Fiscal year/period'].astype(str).str.extract(r'/(\d{3})')
-        df['financial_year'] = df['Fiscal year/period'].astype(str).str.extract(r'\.(\d{4})')
+        # Extract fiscal month code and year, once per distinct period
+        periods = df['Fiscal year/period'].astype(str)
+        distinct_periods = pd.Series(periods.unique())
+        parsed_periods = pd.DataFrame({
+            'fiscal_month_code': distinct_periods.str.extract(r'/(\d{3})', expand=False).to_numpy(),
+            'financial_year': distinct_periods.str.extract(r'\.(\d{4})', expand=False).to_numpy()
+        }, index=distinct_periods.to_numpy())
+        df['fiscal_month_code'] = periods.map(parsed_periods['fiscal_month_code'])
+        df['financial_year'] = periods.map(parsed_periods['financial_year'])
         df['financial_month'] = df['fiscal_month_code'].map(fin_month_map)
 
         # Handle missing values
@@ -119,22 +228,18 @@ def load_cleaned_data(file: Union[str, io.BytesIO]) -> pd.DataFrame:
         
         # Rename to match expected column names
         df.rename(columns={'financial_year': 'year', 'financial_month': 'month'}, inplace=True)
+    clock.lap("fiscal_period")
 
     # Step 6: Clean sector and vessel columns
     for col in ['sector', 'vessel']:
         if col in df.columns:
             df[col] = df[col].astype(str).str.strip().replace('nan', '')
             df[col] = df[col].replace('', pd.NA)
+    clock.lap("dimensions")
 
     # Step 7: Clean and convert KPI columns
-    kpi_cols = ["Total_Income", "DOE", "IOE", "PBT", "GOP"]
-    for col in kpi_cols:
-        if col in df.columns:
-            # Handle different number formats
-            df[col] = df[col].astype(str).str.replace(',', '')  # Remove commas
-            df[col] = df[col].str.replace(r'[^\d.-]', '', regex=True)  # Keep only digits, dots, and minus
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            df[col] = df[col].fillna(0).round(2)  # Fill NaN with 0
+    df = parse_kpi_columns(df, [col for col in KPI_COLS if col in df.columns])
+    clock.lap("kpi_amounts")
 
     # Step 8: Drop unnecessary columns
     cols_to_drop = [
@@ -155,61 +260,321 @@ def load_cleaned_data(file: Union[str, io.BytesIO]) -> pd.DataFrame:
     
     if existing_required:
         df = df.dropna(subset=existing_required)
+    clock.lap("drop_rows", rows=len(df))
+
+    df = compact_dtypes(df)
+    clock.lap("compact_dtypes")
+    return df
+
+def _read_buffer(file: Union[str, io.BytesIO]) -> pa.Buffer:
+    """
+    Expose a path or file-like object as an Arrow buffer.
+
+    Paths are memory-mapped and in-memory uploads are wrapped without a copy.
+    """
+    if isinstance(file, str):  # file path
+        return pa.memory_map(file).read_buffer()
+    if hasattr(file, 'getbuffer'):
+        return pa.py_buffer(file.getbuffer())
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return pa.py_buffer(file.read())
+
+def read_csv_arrow(file: Union[str, io.BytesIO], encoding: str = 'ISO-8859-1') -> pd.DataFrame:
+    """
+    Read an export with the multithreaded pyarrow CSV reader, parsing only SOURCE_COLUMNS.
+
+    Header detection runs on the first rows of the same buffer the full read uses.
+    Kept columns are read as strings so codes keep their exact text; KPI amounts
+    then have their thousands separators removed and are cast to float64 in
+    Arrow, staying text for parse_kpi_columns only if a value will not cast.
+
+    Args:
+        file: File path (string) or file-like object
+        encoding: File encoding
+
+    Returns:
+        pd.DataFrame: Raw kept columns named as in the export
+    """
+    buffer = _read_buffer(file)
+    head = io.BytesIO(buffer[:HEADER_SCAN_BYTES].to_pybytes())
+    combined_headers = detect_header(head, encoding)
+    if combined_headers is not None:
+        names, header_rows = combined_headers, 2
+    else:
+        names, header_rows = list(pd.read_csv(head, encoding=encoding, nrows=0).columns), 1
+
+    # Address columns by position so blank or repeated header names cannot collide
+    keep = [idx for idx, name in enumerate(names) if name in SOURCE_COLUMNS]
+    if not keep:
+        logger.warning("No known export columns in the header; reading all columns")
+        keep = list(range(len(names)))
+    keep_fields = [f"f{idx}" for idx in keep]
+    table = pa_csv.read_csv(
+        pa.BufferReader(buffer),
+        read_options=pa_csv.ReadOptions(
+            skip_rows=header_rows, autogenerate_column_names=True, encoding=encoding, use_threads=True
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=keep_fields,
+            column_types={field: pa.string() for field in keep_fields},
+            strings_can_be_null=True
+        )
+    )
+    kpi_sources = [source for source, target in COLUMN_MAPPING.items() if target in KPI_COLS]
+    columns = []
+    for field, idx in zip(keep_fields, keep):
+        column = table[field]
+        if names[idx] in kpi_sources:
+            try:
+                column = pc.cast(pc.replace_substring(column, ",", ""), pa.float64())
+            except pa.ArrowInvalid:
+                logger.info(f"Column '{names[idx]}' has non-numeric text; parsing it in pandas")
+        columns.append(column)
+    df = pa.table(columns, names=keep_fields).to_pandas()
+    df.columns = [names[idx] for idx in keep]
+    return df
+
+def load_cleaned_data(file: Union[str, io.BytesIO], csv_engine: str = "pandas") -> pd.DataFrame:
+    """
+    Load and clean financial data from CSV file.
+    
+    Args:
+        file: File path (string) or file-like object
+        csv_engine: "pandas" for the pandas C parser, or "pyarrow" for the
+            multithreaded reader that parses only the columns cleaning keeps
+        
+    Returns:
+        pd.DataFrame: Cleaned dataframe ready for database insertion
+    """
+    encoding = 'ISO-8859-1'
+    clock = StageClock("clean")
+
+    # Step 2: Load data based on header structure
+    if csv_engine == "pyarrow":
+        df = read_csv_arrow(file, encoding)
+    else:
+        file_obj = _open_source(file)
+        combined_headers = detect_header(file_obj, encoding)
+        if combined_headers is not None:
+            df = pd.read_csv(file_obj, encoding=encoding, skiprows=2, header=None)
+            df.columns = combined_headers
+        else:
+            df = pd.read_csv(file_obj, encoding=encoding)
+    clock.lap("read_csv", engine=csv_engine, rows=len(df))
+
+    logger.info(f"Initial dataset shape: {df.shape}")
+    if DIAGNOSTIC_LOGGING:
+        logger.info(f"Initial columns: {df.columns.tolist()}")
+
+    df = clean_frame(df)
 
     # Step 10: Final validation and logging
     logger.info(f"Final dataset shape: {df.shape}")
-    if 'year' in df.columns:
-        logger.info(f"Unique years: {sorted(df['year'].unique())}")
-    if 'sector' in df.columns:
-        logger.info(f"Unique sectors: {sorted(df['sector'].unique())}")
-    if 'vessel' in df.columns:
-        logger.info(f"Unique vessels: {len(df['vessel'].unique())} vessels")
-
-    logger.info(f"Final columns: {df.columns.tolist()}")
+    if DIAGNOSTIC_LOGGING:
+        # Sorting every distinct value is costly on big exports, so only when diagnosing
+        if 'year' in df.columns:
+            logger.info(f"Unique years: {sorted(df['year'].unique())}")
+        if 'sector' in df.columns:
+            logger.info(f"Unique sectors: {sorted(df['sector'].unique())}")
+        if 'vessel' in df.columns:
+            logger.info(f"Unique vessels: {len(df['vessel'].unique())} vessels")
+        logger.info(f"Final columns: {df.columns.tolist()}")
     
     return df
 
-def validate_data(df: pd.DataFrame) -> bool:
+def iter_cleaned_chunks(file: Union[str, io.BytesIO],
+                        chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
     """
-    Validate the cleaned dataframe for common issues.
+    Stream a CSV export as cleaned chunks so peak memory stays bounded.
+
+    The header is detected once; every chunk then goes through the same
+    cleaning steps as load_cleaned_data.
     
     Args:
-        df: Cleaned dataframe
+        file: File path (string) or file-like object
+        chunk_rows: Raw rows read per chunk
         
+    Yields:
+        pd.DataFrame: Cleaned chunk ready for database insertion
+    """
+    encoding = 'ISO-8859-1'
+    file_obj = _open_source(file)
+    combined_headers = detect_header(file_obj, encoding)
+
+    # Step 2: Stream data based on header structure
+    if combined_headers is not None:
+        reader = pd.read_csv(file_obj, encoding=encoding, skiprows=2, header=None, chunksize=chunk_rows)
+    else:
+        reader = pd.read_csv(file_obj, encoding=encoding, chunksize=chunk_rows)
+
+    total_rows = 0
+    with reader:
+        for chunk in reader:
+            if combined_headers is not None:
+                chunk.columns = combined_headers
+            cleaned = clean_frame(chunk)
+            total_rows += len(cleaned)
+            logger.debug(f"Cleaned chunk: {chunk.shape[0]} raw rows -> {len(cleaned)} rows")
+            yield cleaned
+
+    logger.info(f"Streamed {total_rows} cleaned rows")
+
+def _clean_export(name: str, data: bytes, csv_engine: str, sample_rows: Optional[int]) -> dict:
+    """Clean and validate one export in a worker process"""
+    start = time.perf_counter()
+    try:
+        df = load_cleaned_data(io.BytesIO(data), csv_engine=csv_engine)
+        report = validation_report(df, sample_rows)
+        valid, error = report["passed"], "; ".join(report["issues"]) or None
+    except Exception as e:
+        df, report, valid, error = None, None, False, str(e)
+    return {
+        "file": name,
+        "rows": 0 if df is None else len(df),
+        "seconds": time.perf_counter() - start,
+        "valid": valid,
+        "error": error,
+        "frame": df,
+        "report": report
+    }
+
+def clean_exports(files: List[Tuple[str, bytes]], csv_engine: str = "pandas",
+                  max_workers: Optional[int] = None, sample_rows: Optional[int] = None) -> List[dict]:
+    """
+    Clean and validate several exports in parallel worker processes.
+
+    Args:
+        files: (file name, raw CSV bytes) pairs
+        csv_engine: CSV reader passed to load_cleaned_data
+        max_workers: Worker processes (default: one per CPU)
+        sample_rows: Validate a sample of this many rows of larger files
+
     Returns:
-        bool: True if validation passes
+        List[dict]: Per file, in input order: file, rows, seconds, valid, error,
+            the cleaned frame and its validation report (None if cleaning failed)
     """
-    issues = []
-    
+    names = [name for name, _ in files]
+    payloads = [data for _, data in files]
+    engines = [csv_engine] * len(files)
+    samples = [sample_rows] * len(files)
+    if len(files) <= 1 or max_workers == 1:
+        return list(map(_clean_export, names, payloads, engines, samples))
+
+    # Spawned workers do not inherit the parent's threads or open connections
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             mp_context=multiprocessing.get_context("spawn")) as pool:
+        return list(pool.map(_clean_export, names, payloads, engines, samples))
+
+# Multiplier mixing per-column hashes into one row hash
+_HASH_MIX = np.uint64(0x100000001B3)
+
+def _combine_hashes(hashes: np.ndarray, columns: List[np.ndarray]) -> np.ndarray:
+    """Fold per-column uint64 hashes into running row hashes"""
+    with np.errstate(over='ignore'):
+        for column_hashes in columns:
+            hashes = hashes * _HASH_MIX ^ column_hashes
+    return hashes
+
+def validation_report(df: pd.DataFrame, sample_rows: Optional[int] = None) -> dict:
+    """
+    Check a cleaned dataframe in one pass and describe what was found.
+
+    Every column is hashed once; the key columns' hashes give the natural-key
+    hash, which the remaining columns extend into the full-row hash, so both
+    duplicate checks run on integer arrays. Negative and missing counts come
+    from one vectorized reduction over all KPI columns.
+
+    Args:
+        df: Cleaned dataframe
+        sample_rows: Check a random sample of this many rows when the frame is
+            larger (duplicate counts are then a lower bound)
+
+    Returns:
+        dict: passed, rows, checked_rows, sampled, missing_columns,
+            duplicate_rows, duplicate_keys, negative_values and missing_values
+            (per column), issues (failures) and warnings
+    """
+    issues, warnings = [], []
+    sampled = sample_rows is not None and len(df) > sample_rows
+    checked = df.sample(n=sample_rows, random_state=0) if sampled else df
+
     # Check for required columns
     required_cols = ['year', 'sector', 'vessel']
     missing_cols = [col for col in required_cols if col not in df.columns]
     if missing_cols:
         issues.append(f"Missing required columns: {missing_cols}")
-    
+
     # Check for empty dataframe
     if df.empty:
         issues.append("Dataframe is empty")
-    
+
+    # Hash each column once, key columns first
+    key_cols = [col for col in NATURAL_KEY if col in checked.columns]
+    other_cols = [col for col in checked.columns if col not in key_cols]
+    column_hashes = {
+        col: pd.util.hash_pandas_object(checked[col], index=False).to_numpy()
+        for col in [*key_cols, *other_cols]
+    }
+    key_hashes = _combine_hashes(np.zeros(len(checked), dtype=np.uint64),
+                                 [column_hashes[col] for col in key_cols])
+    row_hashes = _combine_hashes(key_hashes, [column_hashes[col] for col in other_cols])
+
     # Check for duplicate rows
-    if df.duplicated().sum() > 0:
-        issues.append(f"Found {df.duplicated().sum()} duplicate rows")
-    
+    duplicate_rows = int(pd.Series(row_hashes).duplicated().sum())
+    if duplicate_rows > 0:
+        issues.append(f"Found {duplicate_rows} duplicate rows")
+    duplicate_keys = 0
+    if len(key_cols) == len(NATURAL_KEY):
+        duplicate_keys = int(pd.Series(key_hashes).duplicated().sum())
+        if duplicate_keys > duplicate_rows:
+            warnings.append(
+                f"{duplicate_keys} rows share a (year, month, sector, vessel) key with another row "
+                f"(upserts sum them)"
+            )
+
     # Check for negative values in income columns (might be valid, but worth noting)
-    kpi_cols = ["Total_Income", "DOE", "IOE", "PBT", "GOP"]
-    for col in kpi_cols:
-        if col in df.columns:
-            negative_count = (df[col] < 0).sum()
-            if negative_count > 0:
-                logger.warning(f"Column '{col}' has {negative_count} negative values")
-    
-    if issues:
-        for issue in issues:
-            logger.error(issue)
-        return False
+    kpi_cols = [col for col in KPI_COLS if col in checked.columns]
+    values = checked[kpi_cols].to_numpy(dtype=float, na_value=np.nan)
+    negative_values = dict(zip(kpi_cols, (values < 0).sum(axis=0).tolist()))
+    for col, negative_count in negative_values.items():
+        if negative_count > 0:
+            warnings.append(f"Column '{col}' has {negative_count} negative values")
+    missing_values = {col: int(count) for col, count in checked.isna().sum().items()}
+
+    for warning in warnings:
+        logger.warning(warning)
+    for issue in issues:
+        logger.error(issue)
+    if not issues:
+        logger.info("Data validation passed")
+
+    return {
+        "passed": not issues,
+        "rows": len(df),
+        "checked_rows": len(checked),
+        "sampled": sampled,
+        "missing_columns": missing_cols,
+        "duplicate_rows": duplicate_rows,
+        "duplicate_keys": duplicate_keys,
+        "negative_values": negative_values,
+        "missing_values": missing_values,
+        "issues": issues,
+        "warnings": warnings
+    }
+
+def validate_data(df: pd.DataFrame, sample_rows: Optional[int] = None) -> bool:
+    """
+    Validate the cleaned dataframe for common issues.
     
-    logger.info("Data validation passed")
-    return True
+    Args:
+        df: Cleaned dataframe
+        sample_rows: Check a random sample of this many rows when the frame is larger
+        
+    Returns:
+        bool: True if validation passes (see validation_report for the details)
+    """
+    return validation_report(df, sample_rows)["passed"]
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,426 @@
+import pandas as pd
+import os
+import time
+import logging
+from typing import Callable, Iterable, List, Optional, Union
+from urllib.parse import quote_plus
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, inspect, text, Text
+from sqlalchemy.engine import Connection, Engine
+
+from cleaner_func import NATURAL_KEY
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Settings below can also come from a .env file (or the file named by KPI_ENV_FILE)
+load_dotenv(os.environ.get("KPI_ENV_FILE", ".env"))
+
+# Database configuration from KPI_DB_* environment variables (no defaults, see .env.example)
+DB_CONFIG = {
+    "user": os.environ.get("KPI_DB_USER"),
+    "password": os.environ.get("KPI_DB_PASSWORD"),
+    "host": os.environ.get("KPI_DB_HOST"),
+    "port": os.environ.get("KPI_DB_PORT", "3306"),
+    "name": os.environ.get("KPI_DB_NAME")
+}
+
+# SQLAlchemy URL replacing DB_CONFIG, e.g. sqlite:///kpi_data.db for a local database
+DATABASE_URL = os.environ.get("KPI_DATABASE_URL", "")
+
+# Connection pool of the process-wide engine
+DB_POOL_SIZE = int(os.environ.get("KPI_DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.environ.get("KPI_DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.environ.get("KPI_DB_POOL_RECYCLE", "1800"))
+
+# Rows per INSERT batch
+DEFAULT_CHUNKSIZE = 5000
+
+# Column holding the content hash of a kpi_data row (keyed by cleaner_func.NATURAL_KEY)
+HASH_COLUMN = "row_hash"
+
+# Column tagging rows with the upload (batch) that wrote them, for incremental loading
+BATCH_COLUMN = "batch_id"
+
+# Leading characters of TEXT columns indexed on MySQL, which cannot index whole TEXT values
+INDEX_PREFIX_CHARS = 64
+
+def create_kpi_engine() -> Engine:
+    """
+    Create the kpi_data engine and connection pool from DATABASE_URL or DB_CONFIG.
+
+    Returns:
+        Engine: SQLAlchemy engine (SQLite URLs keep SQLAlchemy's default pool)
+
+    Raises:
+        RuntimeError: Neither KPI_DATABASE_URL nor all KPI_DB_* settings are configured
+    """
+    if DATABASE_URL.startswith("sqlite"):
+        return create_engine(DATABASE_URL)
+
+    url = DATABASE_URL
+    if not url:
+        missing = [f"KPI_DB_{key.upper()}" for key, value in DB_CONFIG.items() if not value]
+        if missing:
+            raise RuntimeError(
+                f"Database is not configured: set KPI_DATABASE_URL or {', '.join(missing)} "
+                "(in the environment or a .env file, see .env.example)"
+            )
+        escaped_password = quote_plus(DB_CONFIG['password'])
+        url = (
+            f"mysql+pymysql://{DB_CONFIG['user']}:{escaped_password}@"
+            f"{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['name']}"
+        )
+    return create_engine(
+        url,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE,
+        # Drop connections the server closed while idle instead of failing a query
+        pool_pre_ping=True
+    )
+
+def new_batch_id() -> int:
+    """Return a batch id (ingest timestamp in milliseconds) for a new upload"""
+    return int(time.time() * 1000)
+
+def ensure_column(engine: Engine, name: str, table_name: str = "kpi_data") -> bool:
+    """
+    Add a BIGINT column (e.g. batch_id or row_hash) to an existing table.
+
+    Args:
+        engine: SQLAlchemy engine
+        name: Column to add if missing
+        table_name: Target table
+
+    Returns:
+        bool: True if the table exists
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return False
+    columns = [col["name"] for col in inspector.get_columns(table_name)]
+    if name not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {name} BIGINT"))
+    return True
+
+def ensure_index(engine: Engine, columns: List[str], table_name: str = "kpi_data") -> bool:
+    """
+    Create an index on columns of an existing table unless one already covers them.
+
+    Args:
+        engine: SQLAlchemy engine
+        columns: Indexed columns, in order
+        table_name: Target table
+
+    Returns:
+        bool: True if the table exists
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return False
+    if any(index["column_names"] == columns for index in inspector.get_indexes(table_name)):
+        return True
+    text_columns = {col["name"] for col in inspector.get_columns(table_name) if isinstance(col["type"], Text)}
+    indexed = [
+        f"{col}({INDEX_PREFIX_CHARS})" if engine.dialect.name == "mysql" and col in text_columns else col
+        for col in columns
+    ]
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX ix_{table_name}_{'_'.join(columns)} ON {table_name} ({', '.join(indexed)})"
+        ))
+    logger.info(f"Created index on {table_name} ({', '.join(columns)})")
+    return True
+
+def ensure_kpi_schema(engine: Engine, table_name: str = "kpi_data") -> bool:
+    """
+    Add the batch_id column and its index, used by incremental loading, to an existing table.
+
+    Args:
+        engine: SQLAlchemy engine
+        table_name: Target table
+
+    Returns:
+        bool: True if the table exists
+    """
+    return ensure_column(engine, BATCH_COLUMN, table_name) and ensure_index(engine, [BATCH_COLUMN], table_name)
+
+def insert_method(engine: Union[Engine, Connection]) -> Optional[str]:
+    """
+    Pick the pandas to_sql insert method for a database backend.
+
+    PyMySQL and sqlite3 already batch executemany natively (PyMySQL rewrites it
+    into multi-row INSERT statements), so they keep the default method. Other
+    backends get explicit multi-row VALUES inserts.
+
+    Args:
+        engine: SQLAlchemy engine or connection
+
+    Returns:
+        Optional[str]: None for the driver's executemany, or "multi"
+    """
+    if engine.dialect.name in ("mysql", "sqlite"):
+        return None
+    return "multi"
+
+def insert_chunks(df: pd.DataFrame, conn: Connection, table_name: str, chunksize: int,
+                  progress_callback: Optional[Callable[[int, int, float], None]] = None,
+                  start: Optional[float] = None) -> int:
+    """
+    Append a dataframe in chunks on an open connection (the caller owns the transaction).
+
+    Args:
+        df: Dataframe to insert
+        conn: Connection with an active transaction
+        table_name: Target table
+        chunksize: Rows per INSERT batch
+        progress_callback: Called with (rows inserted, total rows, elapsed seconds) after each chunk
+        start: perf_counter() value elapsed time is measured from
+
+    Returns:
+        int: Number of rows inserted
+    """
+    total_rows = len(df)
+    method = insert_method(conn)
+    start = time.perf_counter() if start is None else start
+    inserted = 0
+
+    for offset in range(0, max(total_rows, 1), chunksize):
+        chunk = df.iloc[offset:offset + chunksize]
+        chunk.to_sql(table_name, con=conn, if_exists='append', index=False, method=method)
+        inserted += len(chunk)
+        if progress_callback is not None:
+            progress_callback(inserted, total_rows, time.perf_counter() - start)
+
+    return inserted
+
+def bulk_insert(df: Union[pd.DataFrame, Iterable[pd.DataFrame]], engine: Engine,
+                table_name: str = "kpi_data", chunksize: int = DEFAULT_CHUNKSIZE,
+                progress_callback: Optional[Callable[[int, Optional[int], float], None]] = None,
+                extra_columns: Optional[dict] = None) -> dict:
+    """
+    Append a dataframe, or a stream of cleaned chunks, to a table inside a single transaction.
+
+    Args:
+        df: Cleaned dataframe, or an iterable of cleaned chunks (e.g. from iter_cleaned_chunks)
+        engine: SQLAlchemy engine
+        table_name: Target table
+        chunksize: Rows per INSERT batch
+        progress_callback: Called with (rows inserted, total rows or None if streaming,
+            elapsed seconds) after each batch
+        extra_columns: Constant columns (e.g. a batch id) added to inserted rows
+
+    Returns:
+        dict: Inserted row count, elapsed seconds and throughput in rows/s
+    """
+    start = time.perf_counter()
+    frames = [df] if isinstance(df, pd.DataFrame) else df
+    total_rows = len(df) if isinstance(df, pd.DataFrame) else None
+    inserted = 0
+
+    def report_progress(frame_inserted, frame_total, elapsed):
+        if progress_callback is not None:
+            progress_callback(inserted + frame_inserted, total_rows, elapsed)
+
+    # One transaction: either the whole upload lands or none of it does
+    with engine.begin() as conn:
+        for frame in frames:
+            if extra_columns:
+                frame = frame.assign(**extra_columns)
+            inserted += insert_chunks(frame, conn, table_name, chunksize, report_progress, start)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "rows": inserted,
+        "seconds": elapsed,
+        "rows_per_sec": inserted / elapsed if elapsed > 0 else float("inf")
+    }
+    logger.info(f"Bulk inserted {inserted} rows into {table_name} in {elapsed:.2f}s "
+                f"({stats['rows_per_sec']:,.0f} rows/s)")
+    return stats
+
+def content_hash(df: pd.DataFrame) -> pd.Series:
+    """
+    Hash each row of a dataframe into a signed 64-bit integer.
+
+    Args:
+        df: Columns whose content should be hashed
+
+    Returns:
+        pd.Series: int64 hash per row
+    """
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    return pd.Series(hashes.to_numpy().view("int64"), index=df.index)
+
+def sum_by_key(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Sum the numeric (KPI) columns of a frame per natural key.
+
+    Args:
+        df: Cleaned dataframe or chunk
+
+    Returns:
+        pd.DataFrame: One row per natural key
+    """
+    value_cols = [
+        col for col in df.select_dtypes("number").columns
+        if col not in NATURAL_KEY and col != HASH_COLUMN
+    ]
+    return df.groupby(NATURAL_KEY, as_index=False, observed=True)[value_cols].sum()
+
+def stage_upsert_rows(df: Union[pd.DataFrame, Iterable[pd.DataFrame]]) -> pd.DataFrame:
+    """
+    Collapse a cleaned upload to one row per natural key and hash its KPI values.
+
+    Streams are summed chunk by chunk, so memory tracks the number of keys
+    rather than the size of the export.
+
+    Args:
+        df: Cleaned dataframe from load_cleaned_data, or an iterable of cleaned chunks
+
+    Returns:
+        pd.DataFrame: Natural key, summed KPI columns and row_hash
+    """
+    frames = [df] if isinstance(df, pd.DataFrame) else df
+    staged = sum_by_key(pd.concat([sum_by_key(frame) for frame in frames], ignore_index=True))
+    value_cols = [col for col in staged.columns if col not in NATURAL_KEY]
+    # Round like the cleaner so re-summed floats hash identically
+    staged[value_cols] = staged[value_cols].round(2)
+    staged[HASH_COLUMN] = content_hash(staged[value_cols])
+    return staged
+
+def lock_for_upsert(conn: Connection) -> None:
+    """
+    Make an upsert's reads and writes one serialized unit against concurrent writers.
+
+    SQLite takes its write lock up front (BEGIN IMMEDIATE); MySQL locks the rows
+    and gaps the upsert reads through SELECT ... FOR UPDATE instead.
+
+    Args:
+        conn: Connection whose transaction has not run a statement yet
+    """
+    if conn.dialect.name == "sqlite":
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def upsert_kpis(df: Union[pd.DataFrame, Iterable[pd.DataFrame]], engine: Engine,
+                table_name: str = "kpi_data",
+                chunksize: int = DEFAULT_CHUNKSIZE,
+                progress_callback: Optional[Callable[[int, int, float], None]] = None,
+                extra_columns: Optional[dict] = None) -> dict:
+    """
+    Merge a cleaned upload into a table on (year, month, sector, vessel).
+
+    The upload is staged in memory at one row per natural key with a content
+    hash. Keys whose stored hash matches are skipped, new keys are inserted and
+    changed keys (including legacy rows without a hash or with duplicates) are
+    replaced. Stored hashes are read and the changes written inside a single
+    transaction that locks out concurrent upserts, so two writers (e.g. the
+    dashboard and ingest.py) cannot both insert the same new key.
+
+    Args:
+        df: Cleaned dataframe from load_cleaned_data, or an iterable of cleaned chunks
+        engine: SQLAlchemy engine
+        table_name: Target table
+        chunksize: Rows per INSERT batch
+        progress_callback: Called with (rows inserted, total rows, elapsed seconds) after each chunk
+        extra_columns: Constant columns (e.g. a batch id) added to inserted rows
+
+    Returns:
+        dict: Inserted, updated and skipped key counts plus timing
+    """
+    start = time.perf_counter()
+    staged = stage_upsert_rows(df)
+    # Schema changes commit implicitly on MySQL, so they run before the upsert's transaction
+    table_exists = ensure_column(engine, HASH_COLUMN, table_name) and ensure_index(engine, NATURAL_KEY, table_name)
+
+    with engine.begin() as conn:
+        lock_for_upsert(conn)
+        if table_exists and not staged.empty:
+            years = [int(year) for year in staged["year"].unique()]
+            existing = pd.read_sql(
+                text(
+                    f"SELECT year, month, sector, vessel, {HASH_COLUMN} FROM {table_name} "
+                    f"WHERE year IN ({', '.join(str(year) for year in years)})"
+                    + (" FOR UPDATE" if conn.dialect.name == "mysql" else "")
+                ),
+                con=conn,
+                # Nullable dtypes keep 64-bit hashes exact next to legacy NULLs
+                dtype_backend="numpy_nullable"
+            )
+        else:
+            existing = pd.DataFrame(columns=[*NATURAL_KEY, HASH_COLUMN])
+
+        # One stored row with a hash is comparable; anything else gets replaced
+        existing = existing.astype({"year": int, "month": object, "sector": object, "vessel": object})
+        existing_summary = existing.groupby(NATURAL_KEY, as_index=False).agg(
+            stored_rows=(HASH_COLUMN, "size"),
+            stored_hash=(HASH_COLUMN, "first")
+        )
+        merged = staged.merge(existing_summary, on=NATURAL_KEY, how="left")
+        is_new = merged["stored_rows"].isna()
+        is_unchanged = (
+            (merged["stored_rows"] == 1) & (merged["stored_hash"] == merged[HASH_COLUMN])
+        ).fillna(False).astype(bool)
+        is_changed = ~is_new & ~is_unchanged
+
+        to_insert = staged[(is_new | is_changed).to_numpy()]
+        if extra_columns:
+            to_insert = to_insert.assign(**extra_columns)
+        changed_keys = merged.loc[is_changed, NATURAL_KEY].to_dict("records")
+
+        if changed_keys:
+            conn.execute(
+                text(
+                    f"DELETE FROM {table_name} WHERE year = :year AND month = :month "
+                    f"AND sector = :sector AND vessel = :vessel"
+                ),
+                [{**key, "year": int(key["year"])} for key in changed_keys]
+            )
+        if not to_insert.empty:
+            insert_chunks(to_insert, conn, table_name, chunksize, progress_callback, start)
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "inserted": int(is_new.sum()),
+        "updated": int(is_changed.sum()),
+        "skipped": int(is_unchanged.sum()),
+        "rows": len(to_insert),
+        "seconds": elapsed,
+        "rows_per_sec": len(to_insert) / elapsed if elapsed > 0 else float("inf")
+    }
+    logger.info(f"Upserted into {table_name}: {stats['inserted']} inserted, "
+                f"{stats['updated']} updated, {stats['skipped']} unchanged")
+    return stats
+
+def ingest_kpis(df: Union[pd.DataFrame, Iterable[pd.DataFrame]], engine: Engine,
+                mode: str = "append", table_name: str = "kpi_data",
+                chunksize: int = DEFAULT_CHUNKSIZE,
+                progress_callback: Optional[Callable[[int, Optional[int], float], None]] = None) -> dict:
+    """
+    Write a cleaned upload to a table as a new batch.
+
+    Args:
+        df: Cleaned dataframe, or an iterable of cleaned chunks
+        engine: SQLAlchemy engine
+        mode: "append" to bulk-insert, or "upsert" to merge on (year, month, sector, vessel)
+            (replacing stored keys makes the dashboard's next load a full reload)
+        table_name: Target table
+        chunksize: Rows per INSERT batch
+        progress_callback: Called with (rows inserted, total rows, elapsed seconds) after each chunk
+
+    Returns:
+        dict: Stats from upsert_kpis or bulk_insert plus the batch id
+    """
+    batch_id = new_batch_id()
+    ingest = upsert_kpis if mode == "upsert" else bulk_insert
+    stats = ingest(
+        df, engine, table_name=table_name, chunksize=chunksize,
+        progress_callback=progress_callback, extra_columns={BATCH_COLUMN: batch_id}
+    )
+    # The first upload creates the table through to_sql, without indexes
+    ensure_kpi_schema(engine, table_name)
+    return {**stats, "batch_id": batch_id}
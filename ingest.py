@@ -0,0 +1,236 @@
+"""
+Watch a drop directory and load new KPI exports into kpi_data.
+
+Each new CSV is cleaned with load_cleaned_data, checked with validation_report and
+written as one batch, so the dashboard picks it up through its incremental
+loader. Every loaded or rejected file is recorded in a checkpoint ledger keyed
+by its content hash; restarts, and copies of a file already loaded, are not
+reloaded. Files whose load fails (e.g. the database is down) are not recorded
+and are retried on the next scan.
+
+Usage:
+    python ingest.py data/inbox
+    python ingest.py data/inbox --once --mode upsert --csv-engine pyarrow
+"""
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from cleaner_func import load_cleaned_data, validation_report
+from db_func import create_kpi_engine, ensure_kpi_schema, ingest_kpis
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ledger file written inside the drop directory unless --ledger is given
+DEFAULT_LEDGER_NAME = ".ingest_ledger.jsonl"
+
+# Seconds between scans of the drop directory
+DEFAULT_POLL_SECONDS = 30
+
+# Files modified more recently than this are assumed to still be copying
+DEFAULT_SETTLE_SECONDS = 5
+
+def file_stamp(path: str) -> list:
+    """(name, size, modification time) of a file, used to skip re-hashing unchanged files"""
+    stat = os.stat(path)
+    return [os.path.basename(path), stat.st_size, stat.st_mtime_ns]
+
+def file_digest(path: str, block_size: int = 1024 * 1024) -> str:
+    """SHA-256 of a file's content, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class IngestLedger:
+    """
+    Append-only JSON-lines record of processed files, keyed by content hash.
+
+    Each entry is flushed and fsynced before the next file is picked up, so a
+    crash loses at most the file being processed, which is retried on restart.
+    """
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Ledger file, created on first write
+        """
+        self.path = path
+        self.entries: Dict[str, dict] = {}
+        self.stamps = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as file:
+                for line in file:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _add(self, entry: dict) -> None:
+        # A later entry replaces an earlier one unless that content was loaded
+        current = self.entries.get(entry["sha256"])
+        if current is None or current["status"] != "loaded":
+            self.entries[entry["sha256"]] = entry
+        self.stamps.add(tuple(entry["stamp"]))
+
+    def loaded(self, sha256: str) -> Optional[dict]:
+        """The entry that loaded this content, if any"""
+        entry = self.entries.get(sha256)
+        return entry if entry is not None and entry["status"] == "loaded" else None
+
+    def record(self, entry: dict) -> None:
+        """Append an entry for a processed file"""
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self._add(entry)
+
+    def seen(self, path: str) -> bool:
+        """Whether this file, unchanged since, was already processed (checked without hashing it)"""
+        return tuple(file_stamp(path)) in self.stamps
+
+def pending_files(drop_dir: str, ledger: IngestLedger, pattern: str = "*.csv",
+                  settle_seconds: float = DEFAULT_SETTLE_SECONDS) -> List[str]:
+    """
+    List settled files in the drop directory that the ledger has not seen, oldest first.
+
+    Args:
+        drop_dir: Directory to scan
+        ledger: Checkpoint ledger
+        pattern: Glob pattern of export files
+        settle_seconds: Minimum age of a file's last modification
+
+    Returns:
+        List[str]: Paths to ingest
+    """
+    now = time.time()
+    settled = []
+    for path in glob.glob(os.path.join(drop_dir, pattern)):
+        # Files can be moved or deleted between the listing and the stat
+        try:
+            mtime = os.path.getmtime(path)
+            if now - mtime >= settle_seconds and not ledger.seen(path):
+                settled.append((mtime, path))
+        except FileNotFoundError:
+            continue
+    return [path for _, path in sorted(settled)]
+
+def process_file(path: str, engine, mode: str, csv_engine: str) -> dict:
+    """
+    Clean, validate and load one export; returns its row count, status and batch id or issues.
+
+    Files that cannot be cleaned are reported as invalid; errors while loading
+    (e.g. the database is unreachable) are raised.
+    """
+    try:
+        df = load_cleaned_data(path, csv_engine=csv_engine)
+    except Exception as e:
+        logger.exception(f"Failed to clean {path}")
+        return {"rows": 0, "status": "invalid", "issues": [f"Cleaning failed: {e}"]}
+    report = validation_report(df)
+    if not report["passed"]:
+        return {"rows": len(df), "status": "invalid", "issues": report["issues"]}
+    stats = ingest_kpis(df, engine, mode=mode)
+    return {"rows": len(df), "status": "loaded", "batch_id": stats["batch_id"], "written": stats["rows"]}
+
+def ingest_file(path: str, engine, ledger: IngestLedger, mode: str = "append",
+                csv_engine: str = "pandas") -> dict:
+    """
+    Clean, validate and load one export, then record it in the ledger.
+
+    Files that fail cleaning or validation are recorded as invalid, so they are
+    not retried while unchanged. Copies of content already loaded are recorded
+    as duplicates without being loaded. Load errors are raised without
+    recording anything, so the file is retried.
+
+    Args:
+        path: Export file
+        engine: SQLAlchemy engine
+        ledger: Checkpoint ledger
+        mode: "append" or "upsert" (see ingest_kpis)
+        csv_engine: CSV reader passed to load_cleaned_data
+
+    Returns:
+        dict: The ledger entry
+    """
+    start = time.perf_counter()
+    entry = {
+        "file": os.path.basename(path), "sha256": file_digest(path),
+        "stamp": file_stamp(path), "rows": 0
+    }
+    original = ledger.loaded(entry["sha256"])
+    if original is not None:
+        entry.update(status="duplicate", of=original["file"])
+    else:
+        entry.update(process_file(path, engine, mode, csv_engine))
+
+    entry.update(
+        seconds=round(time.perf_counter() - start, 3),
+        ingested_at=datetime.now(timezone.utc).isoformat(timespec="seconds")
+    )
+    ledger.record(entry)
+    logger.info(json.dumps({"event": "ingest", **entry}))
+    return entry
+
+def run(drop_dir: str, ledger_path: Optional[str] = None, mode: str = "append",
+        csv_engine: str = "pandas", poll_seconds: float = DEFAULT_POLL_SECONDS,
+        settle_seconds: float = DEFAULT_SETTLE_SECONDS, once: bool = False) -> None:
+    """
+    Ingest new files from a drop directory until interrupted (or after one scan).
+
+    Args:
+        drop_dir: Directory receiving CSV exports
+        ledger_path: Checkpoint ledger (default: .ingest_ledger.jsonl in drop_dir)
+        mode: "append" or "upsert"
+        csv_engine: "pandas" or "pyarrow"
+        poll_seconds: Seconds between scans
+        settle_seconds: Minimum age of a file before it is picked up
+        once: Stop after a single scan
+    """
+    ledger = IngestLedger(ledger_path or os.path.join(drop_dir, DEFAULT_LEDGER_NAME))
+    engine = create_kpi_engine()
+    ensure_kpi_schema(engine)
+    logger.info(f"Watching {drop_dir} ({len(ledger.entries)} files already in the ledger)")
+
+    while True:
+        for path in pending_files(drop_dir, ledger, settle_seconds=settle_seconds):
+            try:
+                ingest_file(path, engine, ledger, mode=mode, csv_engine=csv_engine)
+            except Exception:
+                logger.exception(f"Failed to load {path}; retrying on the next scan")
+        if once:
+            break
+        time.sleep(poll_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("drop_dir", help="directory receiving CSV exports")
+    parser.add_argument("--ledger", help=f"checkpoint ledger (default: DROP_DIR/{DEFAULT_LEDGER_NAME})")
+    parser.add_argument("--mode", choices=["append", "upsert"],
+                        default=os.environ.get("KPI_INGEST_MODE", "append"))
+    parser.add_argument("--csv-engine", choices=["pandas", "pyarrow"],
+                        default=os.environ.get("KPI_CSV_ENGINE", "pandas"))
+    parser.add_argument("--interval", type=float, default=DEFAULT_POLL_SECONDS,
+                        help="seconds between scans")
+    parser.add_argument("--settle", type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="minimum seconds since a file was last modified")
+    parser.add_argument("--once", action="store_true", help="process pending files and exit")
+    args = parser.parse_args()
+
+    try:
+        run(args.drop_dir, args.ledger, args.mode, args.csv_engine,
+            args.interval, args.settle, args.once)
+    except KeyboardInterrupt:
+        logger.info("Stopped")
+
+if __name__ == "__main__":
+    main()
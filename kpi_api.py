@@ -0,0 +1,252 @@
+"""
+UI-free KPI queries over the dashboard's cleaned kpi_data cube.
+
+Reports come from the dashboard's KPIStore (kpi_store.py): in the dashboard
+process both share one cube (and its slice memo), and a separate API process
+starts from the same Parquet snapshot and catches up through the batch
+watermark.
+
+Python:
+    from kpi_api import query_kpis
+    from kpi_cube import period_key
+    df = query_kpis("monthly", sectors=["CRD"], period_range=(period_key(2024, 4), period_key(2025, 3)))
+
+HTTP (JSON by default, Arrow IPC stream with format=arrow):
+    python kpi_api.py --port 8765
+    curl "http://127.0.0.1:8765/kpis/yearly?year_from=2022&year_to=2024&sectors=CRD"
+"""
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pyarrow as pa
+from sqlalchemy.engine import Engine
+
+from db_func import create_kpi_engine
+from kpi_cube import KPICube, MONTH_ORDER, ROLLUP_GRAINS, period_key, add_month_year
+from kpi_store import REPORTS, get_store
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Local HTTP endpoint defaults
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+ARROW_STREAM_TYPE = "application/vnd.apache.arrow.stream"
+
+_engine: Optional[Engine] = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> Engine:
+    """The process-wide engine used by API calls that do not pass their own"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = create_kpi_engine()
+        return _engine
+
+def report_frame(cube: KPICube, report: str, **filters) -> pd.DataFrame:
+    """
+    Aggregate a report from a cube.
+
+    Month-grain reports carry period and month-year columns and are sorted by period.
+
+    Args:
+        cube: KPI cube
+        report: Key of REPORTS
+        **filters: year_range, period_range, months, quarters, sectors, vessels
+
+    Returns:
+        pd.DataFrame: The aggregate the matching dashboard page shows
+    """
+    grain, group_by = REPORTS[report]
+    df = cube.slice(grain, group_by, **filters)
+    if "month" in group_by:
+        if "period" not in df.columns:
+            df = add_month_year(df)
+        df = df.sort_values(by="period", kind="stable")
+    return df.reset_index(drop=True)
+
+def query_kpis(report: str, engine: Optional[Engine] = None, **filters) -> pd.DataFrame:
+    """
+    Aggregate a report over the current kpi_data, without the dashboard.
+
+    Args:
+        report: "yearly", "monthly", "quarterly", "sector_wise" or "vessel_wise"
+        engine: SQLAlchemy engine (default: one built from the KPI_DB_* settings)
+        **filters: year_range=(from, to), period_range=(from period key, to period key),
+            months, quarters, sectors and vessels (lists)
+
+    Returns:
+        pd.DataFrame: Aggregated KPIs
+    """
+    return query_kpis_with_version(report, engine, **filters)[0]
+
+def query_kpis_with_version(report: str, engine: Optional[Engine] = None,
+                            **filters) -> Tuple[pd.DataFrame, Tuple[int, Optional[int]]]:
+    """Like query_kpis, also returning the (row count, watermark) version the KPIs were computed from"""
+    if report not in REPORTS:
+        raise ValueError(f"Unknown report '{report}'; expected one of {list(REPORTS)}")
+    cube, version = get_store().load_with_version(engine or get_engine())
+    return report_frame(cube, report, **filters), version
+
+def kpi_options(name: str, engine: Optional[Engine] = None) -> List:
+    """Sorted distinct values of a dimension (year, month, sector, vessel, quarter)"""
+    if name not in ROLLUP_GRAINS["month"] + ["quarter"]:
+        raise ValueError(f"Unknown dimension '{name}'")
+    cube = get_store().load(engine or get_engine())
+    if name == "quarter":
+        return sorted(cube.rollups["quarter"]["quarter"].unique().tolist())
+    return cube.options(name)
+
+def parse_filters(params: Dict[str, List[str]]) -> dict:
+    """
+    Filters from URL query parameters.
+
+    year_from/year_to give year_range, period_from/period_to ("YYYY-MM") give
+    period_range, and months, quarters, sectors and vessels are comma-separated.
+    """
+    def first(name):
+        return params[name][0] if name in params else None
+
+    def listed(name):
+        if name not in params:
+            return None
+        return [value for values in params[name] for value in values.split(",") if value]
+
+    def period(value):
+        try:
+            year, month = (int(part) for part in value.split("-"))
+        except ValueError:
+            raise ValueError(f"Invalid period '{value}'; expected YYYY-MM")
+        if not 1 <= month <= 12:
+            raise ValueError(f"Invalid month in period '{value}'")
+        return period_key(year, month)
+
+    filters = {}
+    if first("year_from") or first("year_to"):
+        filters["year_range"] = (int(first("year_from") or 0), int(first("year_to") or 9999))
+    if first("period_from") or first("period_to"):
+        filters["period_range"] = (
+            period(first("period_from")) if first("period_from") else 0,
+            period(first("period_to")) if first("period_to") else period_key(9999, 12)
+        )
+    for name in ["months", "quarters", "sectors", "vessels"]:
+        if listed(name) is not None:
+            filters[name] = listed(name)
+    unknown = [month for month in filters.get("months", []) if month not in MONTH_ORDER]
+    if unknown:
+        raise ValueError(f"Unknown months: {unknown}")
+    return filters
+
+def to_arrow_stream(df: pd.DataFrame, metadata: dict) -> bytes:
+    """Serialize a frame as an Arrow IPC stream with JSON metadata in its schema"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}), b"kpi_api": json.dumps(metadata).encode()
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def make_handler(engine: Engine):
+    """Request handler class bound to an engine"""
+
+    class KPIRequestHandler(BaseHTTPRequestHandler):
+        """GET /reports, /options/<dimension> and /kpis/<report>?<filters>&format=json|arrow"""
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = parse_qs(url.query)
+            parts = [part for part in url.path.split("/") if part]
+            try:
+                if parts == ["reports"]:
+                    self.send_json({"reports": {name: group_by for name, (_, group_by) in REPORTS.items()}})
+                elif len(parts) == 2 and parts[0] == "options":
+                    self.send_json({"dimension": parts[1], "values": kpi_options(parts[1], engine)})
+                elif len(parts) == 2 and parts[0] == "kpis" and parts[1] in REPORTS:
+                    self.send_report(parts[1], params)
+                else:
+                    self.send_json({"error": f"Not found: {url.path}"}, status=404)
+            except ValueError as e:
+                self.send_json({"error": str(e)}, status=400)
+            except Exception as e:
+                logger.exception(f"Failed to answer {self.path}")
+                self.send_json({"error": str(e)}, status=500)
+
+        def send_report(self, report, params):
+            filters = parse_filters(params)
+            start = time.perf_counter()
+            df, (row_count, watermark) = query_kpis_with_version(report, engine, **filters)
+            metadata = {"report": report, "row_count": row_count, "watermark": watermark}
+            if params.get("format", ["json"])[0] == "arrow":
+                self.send_body(to_arrow_stream(df, metadata), ARROW_STREAM_TYPE)
+            else:
+                # Splice pandas' records JSON in rather than round-tripping it through Python objects
+                records = df.to_json(orient="records", date_format="iso")
+                header = json.dumps({**metadata, "columns": list(df.columns)})
+                body = f'{header[:-1]}, "data": {records}}}'
+                self.send_body(body.encode(), "application/json")
+            logger.info(json.dumps({
+                "event": "api", "report": report, "rows": len(df),
+                "seconds": round(time.perf_counter() - start, 4)
+            }))
+
+        def send_json(self, payload, status=200):
+            self.send_body(json.dumps(payload, default=str).encode(), "application/json", status)
+
+        def send_body(self, body, content_type, status=200):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return KPIRequestHandler
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, engine: Optional[Engine] = None,
+          background: bool = False) -> ThreadingHTTPServer:
+    """
+    Serve the KPI endpoint.
+
+    Args:
+        host: Interface to bind (loopback by default)
+        port: TCP port
+        engine: SQLAlchemy engine (default: one built from the KPI_DB_* settings)
+        background: Serve from a daemon thread and return immediately
+
+    Returns:
+        ThreadingHTTPServer: The running server
+    """
+    server = ThreadingHTTPServer((host, port), make_handler(engine or get_engine()))
+    logger.info(f"KPI API listening on http://{host}:{server.server_port}")
+    if background:
+        threading.Thread(target=server.serve_forever, name="kpi-api", daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        serve(args.host, args.port)
+    except KeyboardInterrupt:
+        get_store().wait_for_snapshot()
+        logger.info("Stopped")
+
+if __name__ == "__main__":
+    main()
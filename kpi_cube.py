@@ -0,0 +1,256 @@
+import functools
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cleaner_func import KPI_COLS
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Month names and ordering
+MONTHS = [
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December"
+]
+MONTH_ORDER = {month: idx for idx, month in enumerate(MONTHS, start=1)}
+
+# Quarter mapping
+QUARTER_MAP = {
+    "January": "Q1", "February": "Q1", "March": "Q1",
+    "April": "Q2", "May": "Q2", "June": "Q2",
+    "July": "Q3", "August": "Q3", "September": "Q3",
+    "October": "Q4", "November": "Q4", "December": "Q4"
+}
+
+# Pre-aggregated KPI rollups kept alongside the cleaned frame
+ROLLUP_GRAINS = {
+    "year": ["year", "sector", "vessel"],
+    "quarter": ["year", "quarter", "sector", "vessel"],
+    "month": ["year", "month", "sector", "vessel"]
+}
+
+# Slices a cube keeps before evicting the least recently used one
+DEFAULT_MAX_SLICES = 256
+
+# Parquet schema metadata key holding the snapshot's own metadata
+SNAPSHOT_METADATA_KEY = b"kpi_snapshot"
+
+def period_key(year, month_index):
+    """Integer fiscal-period key (year * 12 + month index); works on scalars and Series"""
+    return year * 12 + month_index
+
+@functools.lru_cache(maxsize=None)
+def period_label(period: int) -> str:
+    """Month-year label ("Apr 2024") for a period key"""
+    year, month_offset = divmod(period - 1, 12)
+    return f"{MONTHS[month_offset][:3]} {year}"
+
+def add_month_year(df: pd.DataFrame) -> pd.DataFrame:
+    """Add month index, period key and month-year columns"""
+    df['month_index'] = df['month'].map(MONTH_ORDER).astype("int8")
+    df['period'] = period_key(df['year'].astype("int32"), df['month_index'].astype("int32"))
+    # Format each distinct period once instead of every row
+    labels = {period: period_label(period) for period in df['period'].unique().tolist()}
+    df['month_year'] = df['period'].map(labels)
+    return df
+
+def concat_kpi_frames(frames: Sequence[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate KPI frames, keeping categorical columns categorical"""
+    dtypes = {}
+    for col in frames[0].select_dtypes("category").columns:
+        categories = frames[0][col].cat.categories
+        for frame in frames[1:]:
+            categories = categories.union(frame[col].cat.categories)
+        dtypes[col] = pd.CategoricalDtype(categories)
+    return pd.concat([frame.astype(dtypes) for frame in frames], ignore_index=True)
+
+def aggregate_rollup(df: pd.DataFrame, grain: str) -> pd.DataFrame:
+    """Sum KPIs to a rollup grain; month rollups also carry month index, period and month-year"""
+    rollup_df = df.groupby(ROLLUP_GRAINS[grain], observed=True)[KPI_COLS].sum().reset_index()
+    if grain == "month":
+        rollup_df = add_month_year(rollup_df)
+    return rollup_df
+
+def build_rollups(df: pd.DataFrame,
+                  rollups: Optional[Dict[str, pd.DataFrame]] = None) -> Dict[str, pd.DataFrame]:
+    """Build KPI rollups from cleaned rows, merging them into existing rollups if given"""
+    keyed_df = df[["year", "month", "sector", "vessel", *KPI_COLS]].assign(
+        quarter=df["month"].map(QUARTER_MAP)
+    )
+    new_rollups = {grain: aggregate_rollup(keyed_df, grain) for grain in ROLLUP_GRAINS}
+    if rollups is None:
+        return new_rollups
+
+    # Only the new rows were aggregated, so merging stays proportional to the upload
+    return {
+        grain: aggregate_rollup(concat_kpi_frames([rollups[grain], new_rollups[grain]]), grain)
+        for grain in ROLLUP_GRAINS
+    }
+
+def filter_kpis(df: pd.DataFrame, year_range=None, period_range=None, months=None,
+                quarters=None, sectors=None, vessels=None) -> pd.DataFrame:
+    """Filter a KPI rollup in pandas with the same selections as the push-down query"""
+    mask = pd.Series(True, index=df.index)
+    if year_range is not None:
+        mask &= df["year"].between(*year_range)
+    if period_range is not None:
+        mask &= df["period"].between(*period_range)
+    for name, values in [("month", months), ("quarter", quarters),
+                         ("sector", sectors), ("vessel", vessels)]:
+        if values is not None:
+            mask &= df[name].isin(values)
+    return df[mask]
+
+def _freeze_filters(filters: dict) -> tuple:
+    """Hashable form of a filter spec (lists become tuples)"""
+    return tuple(sorted(
+        (name, None if values is None else tuple(values)) for name, values in filters.items()
+    ))
+
+class KPICube:
+    """
+    Cleaned KPI rows plus their rollups, answering slice queries from a memo.
+
+    A cube never changes once built: merging new rows returns a new cube, so
+    memoized slices cannot go stale and can be shared by every session.
+    """
+
+    def __init__(self, frame: pd.DataFrame, rollups: Optional[Dict[str, pd.DataFrame]] = None,
+                 max_slices: int = DEFAULT_MAX_SLICES):
+        """
+        Args:
+            frame: Cleaned kpi_data rows
+            rollups: Rollups of frame, built here if not given
+            max_slices: Memoized slices kept before LRU eviction
+        """
+        self.frame = frame
+        self.rollups = build_rollups(frame) if rollups is None else rollups
+        self.max_slices = max_slices
+        self.hits = 0
+        self.misses = 0
+        self._slices = OrderedDict()
+        self._options = {}
+        self._lock = threading.Lock()
+
+    def merge(self, delta_df: pd.DataFrame) -> "KPICube":
+        """
+        Return a new cube with cleaned rows appended.
+
+        Args:
+            delta_df: Cleaned rows not yet in this cube
+
+        Returns:
+            KPICube: Cube over both sets of rows, with an empty slice memo
+        """
+        return KPICube(
+            concat_kpi_frames([self.frame, delta_df]),
+            build_rollups(delta_df, self.rollups),
+            self.max_slices
+        )
+
+    def slice(self, grain: str, group_by: Sequence[str], **filters) -> pd.DataFrame:
+        """
+        Aggregate KPIs by group_by from a rollup grain under a filter spec.
+
+        Args:
+            grain: Rollup to read ("year", "quarter" or "month")
+            group_by: Output dimensions, a subset of the grain's dimensions
+            **filters: year_range, period_range, months, quarters, sectors, vessels
+
+        Returns:
+            pd.DataFrame: A copy of the (memoized) slice, safe for the caller to modify
+        """
+        key = (grain, tuple(group_by), _freeze_filters(filters))
+        with self._lock:
+            if key in self._slices:
+                self._slices.move_to_end(key)
+                self.hits += 1
+                return self._slices[key].copy()
+            self.misses += 1
+
+        df = filter_kpis(self.rollups[grain], **filters)
+        if list(group_by) != ROLLUP_GRAINS[grain]:
+            df = df.groupby(list(group_by), observed=True)[KPI_COLS].sum().reset_index()
+
+        with self._lock:
+            self._slices[key] = df
+            while len(self._slices) > self.max_slices:
+                self._slices.popitem(last=False)
+        return df.copy()
+
+    def options(self, name: str) -> List:
+        """
+        Sorted distinct values of a dimension.
+
+        Args:
+            name: Dimension of the month rollup (e.g. "year", "sector", "vessel")
+
+        Returns:
+            List: Sorted distinct values
+        """
+        if name not in self._options:
+            self._options[name] = sorted(self.rollups["month"][name].unique().tolist())
+        return self._options[name]
+
+def save_snapshot(df: pd.DataFrame, path: str, metadata: dict) -> None:
+    """
+    Write a cleaned KPI frame to a zstd-compressed Parquet snapshot.
+
+    The file is written to a uniquely named temporary file next to its
+    destination and renamed into place, so readers never see a partial
+    snapshot and concurrent writers (e.g. the dashboard and kpi_api.py) do
+    not overwrite each other's temporary file.
+
+    Args:
+        df: Cleaned KPI frame
+        path: Snapshot file path
+        metadata: JSON-serializable details stored with the snapshot (e.g. data version)
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        SNAPSHOT_METADATA_KEY: json.dumps(metadata).encode()
+    })
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=f"{os.path.basename(path)}.",
+                                     suffix=".tmp", delete=False) as tmp_file:
+        tmp_path = tmp_file.name
+    try:
+        pq.write_table(table, tmp_path, compression="zstd")
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f"Wrote KPI snapshot of {len(df)} rows to {path}")
+
+def load_snapshot(path: str) -> Optional[Tuple[pd.DataFrame, dict]]:
+    """
+    Read a Parquet snapshot written by save_snapshot through a memory map.
+
+    Args:
+        path: Snapshot file path
+
+    Returns:
+        Optional[Tuple[pd.DataFrame, dict]]: Frame and its metadata, or None if
+            the snapshot is missing or unreadable
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        table = pq.read_table(path, memory_map=True)
+        metadata = json.loads(table.schema.metadata[SNAPSHOT_METADATA_KEY])
+        return table.to_pandas(), metadata
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable KPI snapshot {path}: {e}")
+        return None
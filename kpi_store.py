@@ -0,0 +1,322 @@
+"""
+The cleaned kpi_data cube shared by the dashboard and the KPI API.
+
+KPIStore keeps one cube per process current with the database: it starts
+from a local Parquet snapshot, then fetches only batches newer than its
+watermark. The push-down query builder here serves KPI_SQL_PUSHDOWN=1.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import nullcontext
+from typing import Callable, ContextManager, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import case, column, func, literal_column, select, table, text
+from sqlalchemy.engine import Engine
+
+from cleaner_func import KPI_COLS, compact_dtypes
+from db_func import BATCH_COLUMN
+from kpi_cube import (
+    KPICube, MONTH_ORDER, QUARTER_MAP, period_key, add_month_year, save_snapshot, load_snapshot
+)
+from timing_func import stage
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Seconds before the kpi_data version is re-checked against the database
+DATA_VERSION_TTL = 60
+
+# Store dashboard KPI columns as float32 (halves their memory, ~7 significant digits)
+COMPACT_FLOAT32 = os.environ.get("KPI_FLOAT32", "0") == "1"
+
+# Read kpi_data into Arrow-backed (pyarrow dtype) frames that stay columnar up to st.dataframe
+ARROW_BACKEND = os.environ.get("KPI_ARROW", "0") == "1"
+READ_SQL_OPTIONS = {"dtype_backend": "pyarrow"} if ARROW_BACKEND else {}
+
+# Cleaned kpi_data snapshot used for cold starts ("" disables it)
+SNAPSHOT_PATH = os.environ.get(
+    "KPI_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "kpi_data.parquet")
+)
+
+# Load only rows from batches newer than the cached watermark (kpi_data.batch_id)
+INCREMENTAL_LOAD = True
+
+# Aggregates behind each analysis page: report name -> (rollup grain, group-by dimensions)
+REPORTS = {
+    "yearly": ("year", ["year", "sector", "vessel"]),
+    "monthly": ("month", ["year", "month", "sector", "vessel"]),
+    "quarterly": ("quarter", ["year", "quarter", "sector", "vessel"]),
+    "sector_wise": ("month", ["year", "sector", "month"]),
+    "vessel_wise": ("month", ["year", "vessel", "month"]),
+}
+
+def clean_kpi_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Clean raw kpi_data rows and derive the month index, period and month-year columns"""
+    text_dtype = "string[pyarrow]" if ARROW_BACKEND else str
+    df['year'] = df['year'].astype(int)
+    df['sector'] = df['sector'].astype(text_dtype).str.strip()
+    df['vessel'] = df['vessel'].astype(text_dtype).str.strip()
+    df = df.dropna(subset=['year', 'sector', 'vessel'])
+    if BATCH_COLUMN in df.columns:
+        df[BATCH_COLUMN] = df[BATCH_COLUMN].astype("int64[pyarrow]" if ARROW_BACKEND else "Int64")
+
+    # Categoricals for dimensions and small integers keep the shared frame compact
+    df = compact_dtypes(add_month_year(df), float32_kpis=COMPACT_FLOAT32)
+    return df.astype({"month_year": "category"})
+
+def snapshot_metadata(row_count: int, watermark: Optional[int]) -> dict:
+    """Data version and cleaning settings recorded with a snapshot"""
+    return {
+        "row_count": row_count, "watermark": watermark,
+        "arrow": ARROW_BACKEND, "float32": COMPACT_FLOAT32
+    }
+
+def read_data_version(engine: Engine) -> Tuple[int, Optional[int]]:
+    """Return the (row count, latest batch id) watermark of kpi_data"""
+    version_df = pd.read_sql(
+        f"SELECT COUNT(*) AS row_count, MAX({BATCH_COLUMN}) AS watermark FROM kpi_data",
+        con=engine
+    )
+    row_count, watermark = version_df.iloc[0]
+    return int(row_count), (None if pd.isna(watermark) else int(watermark))
+
+def max_batch_id(df: pd.DataFrame, default: Optional[int] = None) -> Optional[int]:
+    """Latest batch id among raw kpi_data rows (default if they carry none)"""
+    if BATCH_COLUMN not in df.columns or df[BATCH_COLUMN].isna().all():
+        return default
+    return int(df[BATCH_COLUMN].max())
+
+class KPIStore:
+    """
+    Process-wide cleaned kpi_data cube, kept current with the database.
+
+    A cold store serves the Parquet snapshot at once and reconciles it with
+    the database in the background (the cached cube is also served while the
+    database is unreachable). Loads then fetch only batches newer than the
+    cached watermark; anything else that changed the table forces a full
+    reload. The snapshot is rewritten by a background thread after each
+    change, off the lock requests wait on.
+    """
+
+    def __init__(self, snapshot_path: str = SNAPSHOT_PATH, version_ttl: float = DATA_VERSION_TTL):
+        """
+        Args:
+            snapshot_path: Parquet snapshot for cold starts ("" disables it)
+            version_ttl: Seconds a data version is reused before re-checking the database
+        """
+        self.snapshot_path = snapshot_path
+        self.version_ttl = version_ttl
+        self.cube: Optional[KPICube] = None
+        self.row_count = 0
+        self.watermark: Optional[int] = None
+        self.lock = threading.Lock()
+        self._version: Optional[Tuple[int, Optional[int]]] = None
+        self._version_checked = 0.0
+        # Latest (frame, metadata) waiting to be written, and the thread writing snapshots
+        self._pending_snapshot: Optional[Tuple[pd.DataFrame, dict]] = None
+        self._snapshot_thread: Optional[threading.Thread] = None
+        self._snapshot_lock = threading.Lock()
+
+    def data_version(self, engine: Engine) -> Tuple[int, Optional[int]]:
+        """(row count, watermark) of kpi_data, re-read at most every version_ttl seconds"""
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked > self.version_ttl:
+            self._version, self._version_checked = read_data_version(engine), now
+        return self._version
+
+    def invalidate_version(self) -> None:
+        """Re-read the data version on the next load (call after writing to kpi_data)"""
+        self._version = None
+
+    def restore_snapshot(self) -> None:
+        """Seed an empty store from the local snapshot; the loader then reconciles it with the database"""
+        with stage("snapshot.load"):
+            snapshot = load_snapshot(self.snapshot_path) if self.snapshot_path else None
+        if snapshot is None:
+            return
+        df, metadata = snapshot
+        # A snapshot cleaned with other settings would mix dtypes with fresh batches
+        if metadata != snapshot_metadata(metadata["row_count"], metadata["watermark"]):
+            return
+        with stage("cube.build", rows=len(df)):
+            self.cube = KPICube(df)
+        self.row_count, self.watermark = metadata["row_count"], metadata["watermark"]
+
+    def schedule_snapshot(self, cube: KPICube, metadata: dict) -> None:
+        """Write the cube to the snapshot in the background; only the newest pending cube is written"""
+        with self._snapshot_lock:
+            self._pending_snapshot = (cube.frame, metadata)
+            if self._snapshot_thread is None:
+                self._snapshot_thread = threading.Thread(
+                    target=self._write_snapshots, name="kpi-snapshot", daemon=True
+                )
+                self._snapshot_thread.start()
+
+    def _write_snapshots(self) -> None:
+        while True:
+            with self._snapshot_lock:
+                pending, self._pending_snapshot = self._pending_snapshot, None
+                if pending is None:
+                    self._snapshot_thread = None
+                    return
+            frame, metadata = pending
+            try:
+                with stage("snapshot.save", rows=len(frame)):
+                    save_snapshot(frame, self.snapshot_path, metadata)
+            except Exception:
+                logger.exception(f"Failed to write KPI snapshot {self.snapshot_path}")
+
+    def wait_for_snapshot(self, timeout: Optional[float] = None) -> None:
+        """Block until scheduled snapshot writes have finished (e.g. before exiting)"""
+        with self._snapshot_lock:
+            thread = self._snapshot_thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def refresh_in_background(self, engine: Engine) -> None:
+        """Reconcile the cube with the database from a daemon thread"""
+        def refresh():
+            try:
+                self.load(engine)
+            except Exception:
+                logger.exception("Failed to refresh the KPI cube from the database")
+
+        threading.Thread(target=refresh, name="kpi-refresh", daemon=True).start()
+
+    def load(self, engine: Engine,
+             loading: Optional[Callable[[str], ContextManager]] = None) -> KPICube:
+        """
+        Return the cube for the current data version, fetching only new batches where possible.
+
+        Args:
+            engine: SQLAlchemy engine
+            loading: Context manager factory wrapped around full reloads (e.g. st.spinner)
+
+        Returns:
+            KPICube: Cube over the current kpi_data rows
+        """
+        return self.load_with_version(engine, loading)[0]
+
+    def load_with_version(self, engine: Engine,
+                          loading: Optional[Callable[[str], ContextManager]] = None
+                          ) -> Tuple[KPICube, Tuple[int, Optional[int]]]:
+        """
+        Like load, also returning the (row count, watermark) version the cube was built for.
+
+        Returns:
+            Tuple[KPICube, Tuple[int, Optional[int]]]: Cube and its data version
+        """
+        with self.lock:
+            if self.cube is None:
+                self.restore_snapshot()
+                if self.cube is not None:
+                    # Serve the snapshot right away; the database is checked off this request
+                    self.refresh_in_background(engine)
+                    return self.cube, (self.row_count, self.watermark)
+
+        try:
+            row_count, watermark = self.data_version(engine)
+        except Exception:
+            if self.cube is None:
+                raise
+            logger.exception("Could not check the kpi_data version; serving the cached cube")
+            with self.lock:
+                return self.cube, (self.row_count, self.watermark)
+
+        with self.lock:
+            if self.cube is not None and (row_count, watermark) == (self.row_count, self.watermark):
+                return self.cube, (row_count, watermark)
+
+            # Legacy rows have no batch id, so a missing watermark means "no batches seen yet"
+            last_watermark = self.watermark or 0
+            can_append = (
+                INCREMENTAL_LOAD and self.cube is not None and
+                watermark is not None and watermark > last_watermark
+            )
+            if can_append:
+                with stage("db.read_delta") as fields:
+                    delta_df = pd.read_sql(
+                        text(f"SELECT * FROM kpi_data WHERE {BATCH_COLUMN} > :watermark"),
+                        con=engine,
+                        params={"watermark": last_watermark},
+                        **READ_SQL_OPTIONS
+                    )
+                    fields["rows"] = len(delta_df)
+                # Rows that did not arrive through batches mean the table changed another way
+                can_append = self.row_count + len(delta_df) == row_count
+
+            # Label the cube with the rows actually read: batches committed after the
+            # version check are in them, and must not be fetched again as a delta
+            if can_append:
+                row_count = self.row_count + len(delta_df)
+                watermark = max_batch_id(delta_df, self.watermark)
+                with stage("db.clean", rows=len(delta_df)):
+                    delta_df = clean_kpi_frame(delta_df)
+                with stage("cube.merge", rows=len(delta_df)):
+                    self.cube = self.cube.merge(delta_df)
+            else:
+                with loading("Loading KPI data...") if loading else nullcontext():
+                    with stage("db.read_full") as fields:
+                        df = pd.read_sql("SELECT * FROM kpi_data", con=engine, **READ_SQL_OPTIONS)
+                        fields["rows"] = len(df)
+                    row_count, watermark = len(df), max_batch_id(df)
+                    with stage("db.clean", rows=len(df)):
+                        df = clean_kpi_frame(df)
+                    with stage("cube.build", rows=len(df)):
+                        self.cube = KPICube(df)
+
+            self.row_count, self.watermark = row_count, watermark
+            if self.snapshot_path:
+                self.schedule_snapshot(self.cube, snapshot_metadata(row_count, watermark))
+            return self.cube, (row_count, watermark)
+
+_store: Optional[KPIStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> KPIStore:
+    """The process-wide KPI store shared by the dashboard and the API"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = KPIStore()
+        return _store
+
+# ==============================================
+# PUSH-DOWN QUERIES
+# ==============================================
+
+KPI_TABLE = table("kpi_data", *[column(col) for col in ["year", "month", "sector", "vessel", *KPI_COLS]])
+
+def kpi_dimension(name):
+    """SQL expression for a grouping or filter dimension of kpi_data"""
+    if name == "quarter":
+        return case(QUARTER_MAP, value=KPI_TABLE.c.month)
+    if name == "period":
+        return period_key(KPI_TABLE.c.year, case(MONTH_ORDER, value=KPI_TABLE.c.month))
+    return KPI_TABLE.c[name]
+
+def build_kpi_query(group_by, year_range=None, period_range=None, months=None,
+                    quarters=None, sectors=None, vessels=None):
+    """Build a parameterized SELECT ... WHERE ... GROUP BY for the sidebar selections"""
+    query = select(
+        *[kpi_dimension(name).label(name) for name in group_by],
+        *[func.sum(KPI_TABLE.c[kpi]).label(kpi) for kpi in KPI_COLS]
+    )
+    
+    conditions = []
+    if year_range is not None:
+        conditions.append(KPI_TABLE.c.year.between(*year_range))
+    if period_range is not None:
+        conditions.append(kpi_dimension("period").between(*period_range))
+    for name, values in [("month", months), ("quarter", quarters), 
+                         ("sector", sectors), ("vessel", vessels)]:
+        if values is not None:
+            conditions.append(kpi_dimension(name).in_(list(values)))
+    
+    # Group and order by the output labels so MySQL's ONLY_FULL_GROUP_BY accepts CASE dimensions
+    labels = [literal_column(name) for name in group_by]
+    return query.where(*conditions).group_by(*labels).order_by(*labels)
@@ -0,0 +1,15 @@
+import pandas as pd
+import pytest
+
+from cleaner_func import load_cleaned_data
+from synthetic_export import write_export
+
+@pytest.mark.parametrize("csv_engine", ["pandas", "pyarrow"])
+def test_single_and_double_header_clean_alike(tmp_path, csv_engine):
+    double = load_cleaned_data(write_export(str(tmp_path / "double.csv"), 500), csv_engine=csv_engine)
+    single = load_cleaned_data(
+        write_export(str(tmp_path / "single.csv"), 500, double_header=False), csv_engine=csv_engine
+    )
+    assert {"year", "month", "sector", "vessel"} <= set(double.columns)
+    assert len(double) == 500
+    pd.testing.assert_frame_equal(single, double)
@@ -0,0 +1,84 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import OperationalError
+
+import db_func
+from cleaner_func import load_cleaned_data
+from db_func import BATCH_COLUMN, NATURAL_KEY, bulk_insert, ensure_kpi_schema, ingest_kpis, upsert_kpis
+from synthetic_export import write_export
+
+@pytest.fixture
+def upload(tmp_path):
+    return load_cleaned_data(write_export(str(tmp_path / "export.csv"), 200))
+
+def stored_keys(engine):
+    return pd.read_sql("SELECT year, month, sector, vessel, COUNT(*) AS n FROM kpi_data "
+                       "GROUP BY year, month, sector, vessel", engine)
+
+def indexed_columns(engine):
+    return [index["column_names"] for index in inspect(engine).get_indexes("kpi_data")]
+
+def test_batch_id_indexed(tmp_path):
+    df = load_cleaned_data(write_export(str(tmp_path / "export.csv"), 200))
+
+    # Table created by the first upload
+    engine = create_engine(f"sqlite:///{tmp_path / 'new.db'}")
+    ingest_kpis(df, engine, mode="append")
+    assert [BATCH_COLUMN] in indexed_columns(engine)
+
+    # Legacy table without batch ids
+    legacy = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    df.to_sql("kpi_data", legacy, index=False)
+    assert ensure_kpi_schema(legacy)
+    assert ensure_kpi_schema(legacy)
+    assert indexed_columns(legacy) == [[BATCH_COLUMN]]
+    assert pd.read_sql(f"SELECT {BATCH_COLUMN} FROM kpi_data", legacy)[BATCH_COLUMN].isna().all()
+
+def test_upsert_skips_unchanged_keys(tmp_path, upload):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    first = upsert_kpis(upload, engine)
+    again = upsert_kpis(upload, engine)
+    assert first["inserted"] == again["skipped"] == len(stored_keys(engine))
+    assert (again["inserted"], again["updated"], again["rows"]) == (0, 0, 0)
+
+def test_upsert_replaces_changed_keys(tmp_path, upload):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    upsert_kpis(upload, engine)
+    key = upload.iloc[0][NATURAL_KEY]
+    changed = upload.copy()
+    changed.loc[(changed[NATURAL_KEY] == key).all(axis=1), "DOE"] += 1
+    stats = upsert_kpis(changed, engine)
+    assert (stats["inserted"], stats["updated"]) == (0, 1)
+    assert (stored_keys(engine)["n"] == 1).all()
+
+def test_upsert_collapses_legacy_duplicates(tmp_path, upload):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    bulk_insert(upload, engine)
+    bulk_insert(upload, engine)
+    stats = upsert_kpis(upload, engine)
+    keys = stored_keys(engine)
+    assert stats["updated"] == len(keys) and stats["inserted"] == 0
+    assert (keys["n"] == 1).all()
+
+def test_upsert_locks_out_concurrent_insert(tmp_path, upload, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'kpi.db'}"
+    engine = create_engine(url)
+    bulk_insert(upload.iloc[:1], engine)
+    rival = create_engine(url, connect_args={"timeout": 0.1})
+    read_sql = pd.read_sql
+    blocked = []
+
+    # Another writer tries to add the same new keys after the upsert has read the stored ones
+    def read_then_race(*args, **kwargs):
+        result = read_sql(*args, **kwargs)
+        try:
+            bulk_insert(upload, rival)
+        except OperationalError:
+            blocked.append(True)
+        return result
+
+    monkeypatch.setattr(db_func.pd, "read_sql", read_then_race)
+    upsert_kpis(upload, engine)
+    assert blocked
+    assert (stored_keys(engine)["n"] == 1).all()
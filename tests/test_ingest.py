@@ -0,0 +1,56 @@
+import os
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+from ingest import IngestLedger, ingest_file, pending_files
+from synthetic_export import write_export
+
+def test_failed_load_is_retried(tmp_path):
+    drop_dir = tmp_path / "inbox"
+    drop_dir.mkdir()
+    path = write_export(str(drop_dir / "export.csv"), 200)
+    ledger = IngestLedger(str(tmp_path / "ledger.jsonl"))
+
+    # Database unreachable: nothing is recorded and the file stays pending
+    outage = create_engine(f"sqlite:///{tmp_path / 'missing' / 'kpi.db'}")
+    with pytest.raises(Exception):
+        ingest_file(path, outage, ledger)
+    assert ledger.entries == {}
+    assert pending_files(str(drop_dir), ledger, settle_seconds=0) == [path]
+
+    # Database back: the retry loads the file
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    entry = ingest_file(path, engine, ledger)
+    assert entry["status"] == "loaded"
+    assert pd.read_sql("SELECT COUNT(*) AS n FROM kpi_data", engine)["n"][0] == entry["written"]
+    assert pending_files(str(drop_dir), ledger, settle_seconds=0) == []
+
+    # A touched copy is then a duplicate of the loaded file, also after a restart
+    os.utime(path, ns=(0, 0))
+    ledger = IngestLedger(ledger.path)
+    assert ingest_file(path, engine, ledger)["status"] == "duplicate"
+
+def test_invalid_entry_is_replaced_by_load(tmp_path):
+    ledger = IngestLedger(str(tmp_path / "ledger.jsonl"))
+    ledger.record({"file": "a.csv", "sha256": "abc", "stamp": ["a.csv", 1, 1], "status": "invalid"})
+    assert ledger.loaded("abc") is None
+    ledger.record({"file": "b.csv", "sha256": "abc", "stamp": ["b.csv", 1, 2], "status": "loaded"})
+    ledger.record({"file": "c.csv", "sha256": "abc", "stamp": ["c.csv", 1, 3], "status": "duplicate"})
+    assert IngestLedger(ledger.path).loaded("abc")["file"] == "b.csv"
+
+def test_pending_files_skips_vanished_files(tmp_path, monkeypatch):
+    for name in ["a.csv", "b.csv"]:
+        (tmp_path / name).write_text("x")
+    ledger = IngestLedger(str(tmp_path / "ledger.jsonl"))
+    getmtime = os.path.getmtime
+
+    # b.csv is removed after the directory listing
+    def vanishing(path):
+        if path.endswith("b.csv"):
+            raise FileNotFoundError(path)
+        return getmtime(path)
+
+    monkeypatch.setattr(os.path, "getmtime", vanishing)
+    assert pending_files(str(tmp_path), ledger, settle_seconds=0) == [str(tmp_path / "a.csv")]
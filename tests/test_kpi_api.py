@@ -0,0 +1,21 @@
+import pytest
+
+from kpi_api import parse_filters
+from kpi_cube import period_key
+
+def test_parse_filters():
+    filters = parse_filters({
+        "period_from": ["2024-04"], "period_to": ["2025-03"], "sectors": ["CRD,OFS"], "months": ["April"]
+    })
+    assert filters == {
+        "period_range": (period_key(2024, 4), period_key(2025, 3)),
+        "sectors": ["CRD", "OFS"], "months": ["April"]
+    }
+
+@pytest.mark.parametrize("params", [
+    {"period_from": ["2024-13"]}, {"period_to": ["2024-00"]}, {"period_from": ["2024"]},
+    {"period_to": ["April-2024"]}, {"months": ["Foo"]}
+])
+def test_parse_filters_rejects_invalid(params):
+    with pytest.raises(ValueError):
+        parse_filters(params)
@@ -0,0 +1,51 @@
+import pandas as pd
+from sqlalchemy import create_engine
+
+from cleaner_func import load_cleaned_data
+from db_func import BATCH_COLUMN, bulk_insert, ingest_kpis
+from kpi_store import KPIStore
+from synthetic_export import write_export
+
+def test_load_returns_version_of_its_cube(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    store = KPIStore(snapshot_path="", version_ttl=0)
+    for seed in (0, 1):
+        df = load_cleaned_data(write_export(str(tmp_path / f"export_{seed}.csv"), 300, seed=seed))
+        batch_id = ingest_kpis(df, engine, mode="append")["batch_id"]
+        cube, (row_count, watermark) = store.load_with_version(engine)
+        assert (len(cube.frame), watermark) == (row_count, batch_id)
+
+def test_batch_committed_during_load_is_not_merged_twice(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    df = load_cleaned_data(write_export(str(tmp_path / "export.csv"), 300))
+    store = KPIStore(snapshot_path="", version_ttl=3600)
+    bulk_insert(df, engine, extra_columns={BATCH_COLUMN: 1})
+    store.load(engine)
+
+    # The version is checked after W1 commits, W2 commits before the load reads the table
+    bulk_insert(df, engine, extra_columns={BATCH_COLUMN: 2})
+    store.invalidate_version()
+    store.data_version(engine)
+    bulk_insert(df, engine, extra_columns={BATCH_COLUMN: 3})
+    store.load(engine)
+
+    store.invalidate_version()
+    cube, (row_count, watermark) = store.load_with_version(engine)
+    stored = pd.read_sql("SELECT COUNT(*) AS n FROM kpi_data", engine)["n"][0]
+    assert len(cube.frame) == row_count == stored == 3 * len(df)
+    assert watermark == 3
+
+def test_cold_start_serves_snapshot_without_database(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'kpi.db'}")
+    df = load_cleaned_data(write_export(str(tmp_path / "export.csv"), 300))
+    batch_id = ingest_kpis(df, engine, mode="append")["batch_id"]
+    snapshot_path = str(tmp_path / "kpi_data.parquet")
+    warm = KPIStore(snapshot_path=snapshot_path)
+    warm.load(engine)
+    warm.wait_for_snapshot()
+
+    outage = create_engine(f"sqlite:///{tmp_path / 'missing' / 'kpi.db'}")
+    cold = KPIStore(snapshot_path=snapshot_path, version_ttl=0)
+    for _ in range(2):
+        cube, version = cold.load_with_version(outage)
+        assert (len(cube.frame), version) == (len(df), (len(df), batch_id))
@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Run expensive diagnostic logging (sorted unique values, full column lists)
+DIAGNOSTIC_LOGGING = os.environ.get("KPI_DIAGNOSTIC_LOGGING", "0") == "1"
+
+# Stage records gathered by the innermost collect_stages() block of the current thread
+_collected: ContextVar[Optional[List[dict]]] = ContextVar("collected_stages", default=None)
+
+def record_stage(name: str, seconds: float, **fields) -> dict:
+    """
+    Emit a structured stage timing record.
+
+    The record is logged as a JSON message and as attributes of the log record
+    (stage, seconds, stage_fields), and added to the active collector if any.
+
+    Args:
+        name: Dotted stage name, e.g. "clean.fiscal_period"
+        seconds: Wall time of the stage
+        **fields: JSON-serializable details, e.g. row counts
+
+    Returns:
+        dict: The record
+    """
+    record = {"stage": name, "seconds": round(seconds, 4), **fields}
+    logger.info(
+        json.dumps({"event": "stage", **record}, default=str),
+        extra={"stage": name, "seconds": seconds, "stage_fields": fields}
+    )
+    collected = _collected.get()
+    if collected is not None:
+        collected.append(record)
+    return record
+
+@contextmanager
+def stage(name: str, **fields) -> Iterator[dict]:
+    """
+    Time a block as one stage.
+
+    Yields:
+        dict: Extra fields to record, filled in by the block (e.g. result row counts)
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        record_stage(name, time.perf_counter() - start, **fields)
+
+class StageClock:
+    """Times consecutive steps of a function: each lap records the time since the previous one"""
+
+    def __init__(self, prefix: str):
+        """
+        Args:
+            prefix: Stage name prefix, e.g. "clean"
+        """
+        self.prefix = prefix
+        self._last = time.perf_counter()
+
+    def lap(self, name: str, **fields) -> dict:
+        """Record the step that just finished as "<prefix>.<name>" """
+        now = time.perf_counter()
+        record = record_stage(f"{self.prefix}.{name}", now - self._last, **fields)
+        self._last = now
+        return record
+
+@contextmanager
+def collect_stages() -> Iterator[List[dict]]:
+    """
+    Gather the stage records emitted inside a block (on the current thread).
+
+    Yields:
+        List[dict]: Records in the order their stages finished
+    """
+    records = []
+    token = _collected.set(records)
+    try:
+        yield records
+    finally:
+        _collected.reset(token)